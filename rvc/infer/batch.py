@@ -0,0 +1,198 @@
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+import traceback
+
+from tqdm import tqdm
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".flac", ".ogg", ".m4a", ".aiff", ".ac3"}
+
+
+def collect_inputs(input_path):
+    """
+    Возвращает список (путь к файлу, относительный путь) для пакетной конвертации.
+
+    input_path — папка (обходится рекурсивно, берутся аудиофайлы) или файл-манифест
+    со списком путей по одному на строку (относительные пути считаются от папки манифеста).
+    """
+    if os.path.isdir(input_path):
+        files = []
+        for root, _, names in os.walk(input_path):
+            for name in sorted(names):
+                if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                    path = os.path.join(root, name)
+                    files.append((path, os.path.relpath(path, input_path)))
+        return sorted(files, key=lambda item: item[1])
+
+    if not os.path.isfile(input_path):
+        raise ValueError(f"Не удалось найти папку или манифест '{input_path}'")
+
+    base_dir = os.path.dirname(os.path.abspath(input_path))
+    files = []
+    seen = set()
+    with open(input_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip().strip('"')
+            if not line or line.startswith("#"):
+                continue
+            path = line if os.path.isabs(line) else os.path.join(base_dir, line)
+            # Повторные строки с тем же файлом конвертировали бы его дважды в один и тот же результат
+            key = os.path.normcase(os.path.realpath(path))
+            if key in seen:
+                print(f"Повторный путь в манифесте пропущен: {line}")
+                continue
+            seen.add(key)
+            # Структура папок сохраняется только для путей внутри папки манифеста
+            relative_path = os.path.normpath(line)
+            if os.path.isabs(line) or relative_path.startswith(".."):
+                relative_path = os.path.basename(path)
+            files.append((path, relative_path))
+    return files
+
+
+# Путь к результату: структура папок входа сохраняется, к имени добавляется название модели
+def batch_output_path(relative_path, output_dir, rvc_model, output_format):
+    base_name = os.path.splitext(relative_path)[0]
+    return os.path.join(output_dir, f"{base_name}_({rvc_model}).{output_format}")
+
+
+def assign_output_paths(files, output_dir, rvc_model, output_format):
+    """
+    Возвращает список (путь к файлу, путь к результату) с уникальными путями результатов.
+
+    Разные входы могут дать один и тот же результат (файлы с одинаковым именем из разных
+    папок манифеста, a.wav и a.mp3 в одной папке). Первый вход получает обычное имя,
+    следующие — суффикс _2, _3 и т.д. Порядок входов постоянен, поэтому при возобновлении
+    запуска каждому файлу достается то же имя.
+    """
+    used = set()
+    assigned = []
+    for path, relative_path in files:
+        base_name = os.path.splitext(relative_path)[0]
+        output_path = batch_output_path(relative_path, output_dir, rvc_model, output_format)
+        suffix = 1
+        while os.path.normcase(output_path) in used:
+            suffix += 1
+            output_path = batch_output_path(f"{base_name}_{suffix}", output_dir, rvc_model, output_format)
+        if suffix > 1:
+            print(f"Результат для {path} совпадает с результатом другого файла, сохраняется как {output_path}")
+        used.add(os.path.normcase(output_path))
+        assigned.append((path, output_path))
+    return assigned
+
+
+# Рабочий процесс: модели загружаются один раз (кэш моделей) и переиспользуются для всех файлов
+def _worker(worker_id, tasks, results, params, index_mmap=False):
+    from rvc.infer.infer import index_cache, rvc_infer
+
+    # Индексы FAISS открываются через memory-map, чтобы процессы разделяли одну копию в памяти
+    if index_mmap:
+        index_cache.use_mmap = True
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        input_path, output_path = task
+        start = time.time()
+        # Пишем во временный файл, чтобы прерванная конвертация не считалась готовой при возобновлении
+        root, ext = os.path.splitext(output_path)
+        tmp_path = f"{root}.part{ext}"
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            rvc_infer(**params, input_path=input_path, output_path=tmp_path)
+            os.replace(tmp_path, output_path)
+            record = {"status": "done"}
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            record = {"status": "error", "error": str(e), "traceback": traceback.format_exc()}
+
+        record.update(
+            {
+                "input": input_path,
+                "output": output_path,
+                "worker": worker_id,
+                "seconds": round(time.time() - start, 3),
+            }
+        )
+        results.put(record)
+
+
+def run_batch(input_path, output_dir, report_path=None, workers=1, index_mmap=None, **params):
+    """
+    Пакетная конвертация папки или манифеста в нескольких рабочих процессах.
+
+    Каждый процесс загружает модели один раз и берет файлы из общей очереди.
+    Статус каждого файла дописывается в JSONL-отчет; уже существующие результаты
+    пропускаются, поэтому прерванный запуск можно продолжить той же командой.
+    index_mmap включает memory-map индексов FAISS в рабочих процессах
+    (по умолчанию — если процессов больше одного).
+    Возвращает словарь со счетчиками done/skipped/error.
+    """
+    rvc_model = params["rvc_model"]
+    output_format = params.get("output_format", "wav")
+    report_path = report_path or os.path.join(output_dir, "batch_report.jsonl")
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+
+    counts = {"done": 0, "skipped": 0, "error": 0}
+    pending = []
+    with open(report_path, "a", encoding="utf-8") as report:
+
+        def write(record):
+            counts[record["status"]] += 1
+            record["time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            report.write(json.dumps(record, ensure_ascii=False) + "\n")
+            report.flush()
+
+        for path, output_path in assign_output_paths(collect_inputs(input_path), output_dir, rvc_model, output_format):
+            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                write({"status": "skipped", "input": path, "output": output_path})
+            else:
+                pending.append((path, output_path))
+
+        print(f"Файлов к конвертации: {len(pending)}, пропущено (уже готовы): {counts['skipped']}")
+        if not pending:
+            return counts
+
+        # spawn — безопасный способ запуска процессов, использующих CUDA
+        ctx = mp.get_context("spawn")
+        tasks, results = ctx.Queue(), ctx.Queue()
+        for task in pending:
+            tasks.put(task)
+
+        workers = max(1, min(workers, len(pending)))
+        if index_mmap is None:
+            index_mmap = workers > 1
+        for _ in range(workers):
+            tasks.put(None)
+        processes = [ctx.Process(target=_worker, args=(i, tasks, results, params, index_mmap), daemon=True) for i in range(workers)]
+        for process in processes:
+            process.start()
+
+        remaining = {task[0] for task in pending}
+        with tqdm(total=len(pending), desc="Пакетная конвертация") as bar:
+            while remaining:
+                try:
+                    record = results.get(timeout=1)
+                except queue.Empty:
+                    # Все процессы завершились (например, упали), а файлы остались необработанными
+                    if not any(process.is_alive() for process in processes):
+                        break
+                    continue
+                remaining.discard(record["input"])
+                write(record)
+                bar.update(1)
+
+        for path in sorted(remaining):
+            write({"status": "error", "input": path, "error": "Рабочий процесс завершился до обработки файла"})
+
+        for process in processes:
+            process.join()
+
+    print(f"Готово: {counts['done']}, пропущено: {counts['skipped']}, ошибок: {counts['error']}. Отчет: {report_path}")
+    return counts
@@ -1,7 +1,11 @@
+import os
 from multiprocessing import cpu_count
 
 import torch
 
+# Поддерживаемые режимы точности инференса
+PRECISIONS = {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}
+
 
 # Конфигурация устройства и параметров
 class Config:
@@ -15,6 +19,43 @@ class Config:
         self.gpu_mem = None
         # Конфигурируем параметры, специфичные для устройства
         self.x_pad, self.x_query, self.x_center, self.x_max = self.device_config()
+        # Бюджет памяти (в МБ) для кэша моделей, которые остаются загруженными между вызовами
+        self.model_cache_mb = int(os.environ.get("RVC_MODEL_CACHE_MB", 4096))
+        # Количество индексов FAISS в кэше; RVC_INDEX_MMAP=1 открывает индекс и big_npy через memory-map,
+        # чтобы несколько рабочих процессов разделяли одну копию в памяти
+        self.index_cache_size = int(os.environ.get("RVC_INDEX_CACHE_SIZE", 8))
+        self.index_mmap = os.environ.get("RVC_INDEX_MMAP", "0") == "1"
+        # Количество сегментов, обрабатываемых за один проход синтезатора (HuBERT — по одному сегменту)
+        self.batch_size = int(os.environ.get("RVC_BATCH_SIZE", 1))
+        # Кэш исходного F0 по хэшу аудио в памяти (RVC_F0_CACHE=0 отключает кэш).
+        # Копия на диске включается через RVC_F0_CACHE_DISK=1; ее размер ограничен RVC_F0_CACHE_MAX_MB
+        self.f0_cache = os.environ.get("RVC_F0_CACHE", "1") == "1"
+        self.f0_cache_dir = None
+        if os.environ.get("RVC_F0_CACHE_DISK", "0") == "1":
+            self.f0_cache_dir = os.environ.get("RVC_F0_CACHE_DIR", os.path.join(os.getcwd(), "cache", "f0"))
+        self.f0_cache_max_mb = int(os.environ.get("RVC_F0_CACHE_MAX_MB", 256))
+        # Кэш признаков HuBERT на диске (float16, ~280 МБ на час аудио), включается через RVC_FEATURE_CACHE=1.
+        # Размер ограничен RVC_FEATURE_CACHE_MAX_MB, при превышении удаляются самые давно использованные файлы
+        self.feature_cache = os.environ.get("RVC_FEATURE_CACHE", "0") == "1"
+        self.feature_cache_dir = os.environ.get("RVC_FEATURE_CACHE_DIR", os.path.join(os.getcwd(), "cache", "features"))
+        self.feature_cache_max_mb = int(os.environ.get("RVC_FEATURE_CACHE_MAX_MB", 2048))
+        # Кэш декодированного входного аудио (кроме WAV) в .npy, включается через RVC_AUDIO_CACHE=1.
+        # Размер ограничен RVC_AUDIO_CACHE_MAX_MB (~230 МБ на час аудио при 16 кГц)
+        self.audio_cache = os.environ.get("RVC_AUDIO_CACHE", "0") == "1"
+        self.audio_cache_dir = os.environ.get("RVC_AUDIO_CACHE_DIR", os.path.join(os.getcwd(), "cache", "audio"))
+        self.audio_cache_max_mb = int(os.environ.get("RVC_AUDIO_CACHE_MAX_MB", 1024))
+        # Точность инференса (fp32, fp16, bf16); фаза синусного генератора всегда считается в fp32
+        self.precision = self.get_precision(os.environ.get("RVC_PRECISION", "fp32").lower())
+        self.dtype = PRECISIONS[self.precision]
+        # Бэкенд синтезатора: torch (по умолчанию), onnx (onnxruntime на CPU) или torchscript (экспортированный граф на CPU).
+        # onnx и torchscript экспериментальные: их скорость относительно torch не измерена (см. infer_cli benchmark)
+        self.backend = os.environ.get("RVC_BACKEND", "torch").lower()
+        if self.backend not in ("torch", "onnx", "torchscript"):
+            raise ValueError(f"Неизвестный бэкенд '{self.backend}'. Доступные: torch, onnx, torchscript")
+        if self.backend != "torch":
+            print(f"[WARNING] Бэкенд '{self.backend}' экспериментальный; при проблемах используйте RVC_BACKEND=torch")
+        # Количество потоков onnxruntime (0 — по умолчанию)
+        self.backend_threads = int(os.environ.get("RVC_BACKEND_THREADS", 0))
 
     # Определяем устройство для использования
     def get_device(self):
@@ -24,6 +65,22 @@ class Config:
             return "mps"
         return "cpu"
 
+    # Проверяем, что выбранная точность поддерживается устройством
+    def get_precision(self, precision):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Неизвестная точность '{precision}'. Доступные: {', '.join(PRECISIONS)}")
+
+        if precision == "fp16" and self.device == "cpu":
+            print("fp16 на CPU не поддерживается, используется fp32 (для CPU доступен bf16)")
+            return "fp32"
+        if precision == "bf16" and self.device == "cuda" and not torch.cuda.is_bf16_supported():
+            print("GPU не поддерживает bf16, используется fp16")
+            return "fp16"
+        if precision == "bf16" and self.device == "mps":
+            print("bf16 на MPS не поддерживается, используется fp16")
+            return "fp16"
+        return precision
+
     # Конфигурируем параметры, специфичные для устройства
     def device_config(self):
         if torch.cuda.is_available():
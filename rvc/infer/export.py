@@ -0,0 +1,197 @@
+import os
+import time
+
+import numpy as np
+import torch
+
+from rvc.lib.algorithm.synthesizers import Synthesizer
+
+EXPORT_FORMATS = ("onnx", "torchscript")
+EXPORT_EXTENSIONS = {"onnx": ".onnx", "torchscript": ".ts.pt"}
+
+
+# Создает синтезатор из чекпоинта голосовой модели (на CPU, в fp32)
+def build_synthesizer(cpt, model_path):
+    # Проверяем корректность формата модели
+    if "config" not in cpt or "weight" not in cpt:
+        raise ValueError(f"Некорректный формат для {model_path}. Используйте голосовую модель, обученную на RVC v2.")
+
+    cpt["config"][-3] = cpt["weight"]["emb_g.weight"].shape[0]
+    use_f0 = cpt.get("f0", 1)
+    version = cpt.get("version", "v1")
+    vocoder = cpt.get("vocoder", "HiFi-GAN")
+    input_dim = 768 if version == "v2" else 256
+
+    net_g = Synthesizer(*cpt["config"], use_f0=use_f0, text_enc_hidden_dim=input_dim, vocoder=vocoder)
+
+    # Удаляем ненужный слой
+    del net_g.enc_q
+    net_g.load_state_dict(cpt["weight"], strict=False)
+    net_g.eval()
+    return net_g
+
+
+# Обертка над Synthesizer.infer с фиксированным набором входов для трассировки
+class ExportableSynthesizer(torch.nn.Module):
+    def __init__(self, net_g):
+        super().__init__()
+        self.net_g = net_g
+
+    def forward(self, phone, phone_lengths, pitch, nsff0, sid):
+        return self.net_g.infer(phone, phone_lengths, pitch, nsff0, sid)[0]
+
+
+# Обертка для моделей без F0
+class ExportableSynthesizerNoF0(torch.nn.Module):
+    def __init__(self, net_g):
+        super().__init__()
+        self.net_g = net_g
+
+    def forward(self, phone, phone_lengths, sid):
+        return self.net_g.infer(phone, phone_lengths, sid=sid)[0]
+
+
+# Путь к экспортированной модели рядом с исходным файлом .pth
+def exported_path(model_path, fmt):
+    return os.path.splitext(model_path)[0] + EXPORT_EXTENSIONS[fmt]
+
+
+# Пример входов для трассировки и замеров: (обертка, входы, имена входов)
+def example_inputs(cpt, net_g, frames):
+    input_dim = 768 if cpt.get("version", "v1") == "v2" else 256
+    phone = torch.rand(1, frames, input_dim)
+    phone_lengths = torch.tensor([frames]).long()
+    sid = torch.tensor([0]).long()
+    if cpt.get("f0", 1):
+        pitch = torch.randint(1, 255, (1, frames)).long()
+        nsff0 = torch.rand(1, frames) * 500 + 50
+        return (
+            ExportableSynthesizer(net_g).eval(),
+            (phone, phone_lengths, pitch, nsff0, sid),
+            ["phone", "phone_lengths", "pitch", "nsff0", "sid"],
+        )
+    return ExportableSynthesizerNoF0(net_g).eval(), (phone, phone_lengths, sid), ["phone", "phone_lengths", "sid"]
+
+
+# Оптимизирует трассированный граф: заморозка весов и слияние conv+bias+активация (oneDNN на CPU)
+def optimize_traced(model):
+    model.eval()
+    try:
+        return torch.jit.optimize_for_inference(torch.jit.freeze(model))
+    except RuntimeError as e:
+        print(f"Не удалось оптимизировать TorchScript граф, используется исходный: {e}")
+        return model
+
+
+def export_model(model_path, fmt="onnx", output_path=None, opset=17, frames=200):
+    """
+    Экспортирует Synthesizer.infer голосовой модели в ONNX или TorchScript.
+    Бэкенды onnx и torchscript экспериментальные; по умолчанию используется torch.
+
+    Весовая нормализация свертывается в обычные веса перед экспортом.
+    Поддерживаются все вокодеры (HiFi-GAN NSF, MRF HiFi-GAN, RefineGAN) и модели без F0.
+    Длина входа (кадры) и размер батча в экспортированном графе динамические.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта '{fmt}'. Доступные: {', '.join(EXPORT_FORMATS)}")
+
+    cpt = torch.load(model_path, map_location="cpu", weights_only=True)
+    net_g = build_synthesizer(cpt, model_path).float().optimize_for_inference()
+    output_path = output_path or exported_path(model_path, fmt)
+    wrapper, inputs, input_names = example_inputs(cpt, net_g, frames)
+
+    with torch.no_grad():
+        if fmt == "onnx":
+            dynamic_axes = {name: {0: "batch", 1: "frames"} for name in ("phone", "pitch", "nsff0") if name in input_names}
+            dynamic_axes.update({"phone_lengths": {0: "batch"}, "sid": {0: "batch"}, "audio": {0: "batch", 2: "samples"}})
+            torch.onnx.export(
+                wrapper,
+                inputs,
+                output_path,
+                input_names=input_names,
+                output_names=["audio"],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset,
+                do_constant_folding=True,
+            )
+        else:
+            # Синусный генератор и сэмплирование латентов содержат случайность, поэтому проверка трассировки отключена
+            traced = torch.jit.trace(wrapper, inputs, check_trace=False)
+            traced.save(output_path)
+
+    print(f"Модель экспортирована: {output_path}")
+    return output_path
+
+
+# Синтезатор, исполняемый через onnxruntime на CPU
+class OnnxSynthesizer:
+    def __init__(self, model_path, num_threads=0):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("Для бэкенда onnx требуется пакет onnxruntime (pip install onnxruntime)")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, phone, phone_lengths, *args):
+        values = [phone, phone_lengths, *args]
+        feeds = {}
+        for name, value in zip(self.input_names, values):
+            value = value.detach().cpu()
+            feeds[name] = (value.float() if value.is_floating_point() else value.long()).numpy()
+        return torch.from_numpy(np.asarray(self.session.run(["audio"], feeds)[0]))
+
+
+def load_exported(model_path, backend, num_threads=0):
+    """
+    Загружает экспортированный синтезатор для бэкенда onnx или torchscript.
+    Если экспортированного файла еще нет, модель экспортируется автоматически.
+    """
+    path = exported_path(model_path, backend)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(model_path):
+        export_model(model_path, backend, path)
+
+    if backend == "onnx":
+        return OnnxSynthesizer(path, num_threads)
+    return optimize_traced(torch.jit.load(path, map_location="cpu"))
+
+
+def benchmark_synthesizer(model_path, seconds=10.0, runs=5):
+    """
+    Замеряет время синтеза одного сегмента на CPU для трех вариантов модели:
+    с весовой нормализацией на каждом проходе, со свернутой нормализацией
+    и оптимизированный TorchScript (слияние conv+bias+активация).
+    Возвращает словарь {вариант: среднее время в мс}.
+    """
+    cpt = torch.load(model_path, map_location="cpu", weights_only=True)
+    frames = int(seconds * 100)
+
+    variants = {}
+    wrapper, inputs, _ = example_inputs(cpt, build_synthesizer(cpt, model_path).float(), frames)
+    variants["weight_norm"] = wrapper
+
+    wrapper, inputs, _ = example_inputs(cpt, build_synthesizer(cpt, model_path).float().optimize_for_inference(), frames)
+    variants["folded"] = wrapper
+    with torch.no_grad():
+        variants["torchscript"] = optimize_traced(torch.jit.trace(wrapper, inputs, check_trace=False))
+
+    results = {}
+    with torch.no_grad():
+        for name, model in variants.items():
+            # Первый проход — прогрев (ленивая инициализация, оптимизации JIT)
+            model(*inputs)
+            start = time.perf_counter()
+            for _ in range(runs):
+                model(*inputs)
+            results[name] = (time.perf_counter() - start) / runs * 1000
+
+    base = results["weight_norm"]
+    print(f"Сегмент {seconds:.1f} с, {runs} прогонов:")
+    for name, ms in results.items():
+        print(f"  {name:<12} {ms:9.1f} мс  (x{base / ms:.2f})")
+    return results
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from rvc.lib import disk_cache
+
+
+# Кэш исходного F0 (до автотюна и сдвига высоты тона) в памяти и, по желанию, на диске
+class F0Cache:
+    def __init__(self, cache_dir=None, max_entries=32, max_disk_mb=256):
+        """
+        Инициализация кэша F0.
+
+        Ключ включает хэш аудио, метод F0, диапазон частот и шаг кадра, поэтому
+        повторная конвертация того же входа другой моделью или с другим питчем
+        не требует повторного извлечения тона.
+
+        Если задан cache_dir, контуры также сохраняются на диск; суммарный размер файлов
+        ограничен max_disk_mb, при превышении удаляются самые давно использованные.
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def audio_hash(audio):
+        audio = np.ascontiguousarray(audio)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str((audio.dtype.str, audio.shape)).encode())
+        digest.update(audio.data)
+        return digest.hexdigest()
+
+    def make_key(self, audio, f0_method, f0_min, f0_max, hop):
+        return f"{self.audio_hash(audio)}_{f0_method}_{f0_min}_{f0_max}_{hop}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key].copy()
+
+        if self.cache_dir and os.path.exists(self._path(key)):
+            try:
+                f0 = np.load(self._path(key))
+            except (OSError, ValueError):
+                f0 = None
+            if f0 is not None:
+                disk_cache.touch(self._path(key))
+                with self.lock:
+                    self.disk_hits += 1
+                    self._remember(key, f0)
+                return f0.copy()
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, f0):
+        f0 = np.array(f0)
+        with self.lock:
+            self._remember(key, f0)
+
+        if self.cache_dir:
+            # Запись через временный файл, чтобы параллельные процессы не прочитали неполный файл
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, f0)
+            os.replace(tmp_path, self._path(key))
+            disk_cache.trim(self.cache_dir, self.max_disk_bytes)
+
+    def _remember(self, key, f0):
+        self.entries[key] = f0
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+
+_shared_cache = None
+
+
+# Возвращает общий для процесса кэш F0
+def get_f0_cache(cache_dir=None, max_entries=32, max_disk_mb=256):
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = F0Cache(cache_dir, max_entries, max_disk_mb)
+    return _shared_cache
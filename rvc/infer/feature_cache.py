@@ -0,0 +1,88 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from rvc.lib import disk_cache
+
+
+# Контрольная сумма файла (используется для идентификации эмбеддера)
+def file_checksum(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Кэш признаков HuBERT на диске (float16, открывается через memory-map)
+class FeatureCache:
+    def __init__(self, cache_dir, max_disk_mb=2048):
+        """
+        Инициализация кэша признаков.
+
+        Ключ включает хэш сегмента аудио (а значит и его границы), контрольную сумму
+        эмбеддера и выходной слой, поэтому признаки одного и того же входа можно
+        переиспользовать при конвертации разными голосовыми моделями.
+
+        Суммарный размер файлов ограничен max_disk_mb, при превышении удаляются самые давно использованные.
+        """
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(audio, embedder_checksum, output_layer):
+        audio = np.ascontiguousarray(audio)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str((audio.dtype.str, audio.shape)).encode())
+        digest.update(audio.data)
+        return f"{digest.hexdigest()}_{embedder_checksum}_{output_layer}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        path = self._path(key)
+        feats = None
+        if os.path.exists(path):
+            try:
+                feats = np.load(path, mmap_mode="r")
+            except (OSError, ValueError):
+                feats = None
+            if feats is not None:
+                disk_cache.touch(path)
+
+        with self.lock:
+            if feats is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return feats
+
+    def put(self, key, feats):
+        # Запись через временный файл, чтобы параллельные процессы не прочитали неполный файл
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(feats, dtype=np.float16))
+        os.replace(tmp_path, self._path(key))
+        disk_cache.trim(self.cache_dir, self.max_disk_bytes)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_shared_cache = None
+
+
+# Возвращает общий для процесса кэш признаков
+def get_feature_cache(cache_dir, max_disk_mb=2048):
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = FeatureCache(cache_dir, max_disk_mb)
+    return _shared_cache
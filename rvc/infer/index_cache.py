@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+
+# Кэш индексов FAISS и восстановленных матриц признаков (big_npy)
+class IndexCache:
+    def __init__(self, max_entries=8, use_mmap=False):
+        """
+        Инициализация кэша индексов.
+
+        Если use_mmap включен, сам индекс открывается через memory-map (faiss.IO_FLAG_MMAP_IFC
+        или IO_FLAG_MMAP в старых версиях FAISS), а big_npy сохраняется рядом с индексом
+        в виде файла .npy и тоже открывается через memory-map. Несколько рабочих процессов
+        при этом разделяют одну физическую копию индекса и признаков (страничный кэш ОС).
+        """
+        self.max_entries = max_entries
+        self.use_mmap = use_mmap
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Ключи, загружаемые в данный момент, и события окончания их загрузки
+        self.loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.sidecar_hits = 0
+
+    @staticmethod
+    def sidecar_path(file_index):
+        return os.path.splitext(file_index)[0] + ".features.npy"
+
+    @staticmethod
+    def metadata_path(file_index):
+        return os.path.splitext(file_index)[0] + ".index.json"
+
+    def _apply_search_params(self, path, index):
+        # Параметры поиска (nprobe, efSearch), подобранные при построении индекса (extract_index.py)
+        metadata_path = self.metadata_path(path)
+        if not os.path.exists(metadata_path):
+            return
+        try:
+            with open(metadata_path, encoding="utf-8") as f:
+                search_params = json.load(f).get("search_params", {})
+            if search_params:
+                params = ",".join(f"{k}={v}" for k, v in search_params.items())
+                faiss.ParameterSpace().set_index_parameters(index, params)
+                print(f"Параметры поиска индекса {os.path.basename(path)}: {params}")
+        except Exception as error:
+            print(f"Не удалось применить параметры поиска из {metadata_path}: {error}")
+
+    def get(self, file_index):
+        """
+        Возвращает (index, big_npy) для файла индекса, загружая его при первом обращении.
+        """
+        path = os.path.realpath(file_index)
+        key = (path, os.path.getmtime(path))
+        while True:
+            with self.lock:
+                if key in self.entries:
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return self.entries[key]
+                loading = self.loading.get(key)
+                if loading is None:
+                    self.misses += 1
+                    loading = self.loading[key] = threading.Event()
+                    break
+            # Если загрузка в другом потоке завершилась ошибкой, записи не будет и этот поток загрузит индекс сам
+            loading.wait()
+
+        # Чтение индекса и восстановление признаков идут вне блокировки, чтобы не задерживать обращения к другим индексам
+        try:
+            index = self._read_index(path)
+            self._apply_search_params(path, index)
+            big_npy = self._load_features(path, index) if self.use_mmap else index.reconstruct_n(0, index.ntotal)
+            with self.lock:
+                # Устаревшие версии того же индекса больше не понадобятся
+                for stale in [k for k in self.entries if k[0] == path]:
+                    del self.entries[stale]
+                self.entries[key] = (index, big_npy)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            return index, big_npy
+        finally:
+            with self.lock:
+                del self.loading[key]
+            loading.set()
+
+    def _read_index(self, path):
+        if not self.use_mmap:
+            return faiss.read_index(path)
+        # IO_FLAG_MMAP_IFC отображает коды и списки IVF/HNSW/Flat; в FAISS < 1.8 есть только IO_FLAG_MMAP (списки IVF)
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError as error:
+            print(f"Не удалось открыть индекс {path} через memory-map, индекс загружается в память: {error}")
+            return faiss.read_index(path)
+
+    def _load_features(self, path, index):
+        sidecar = self.sidecar_path(path)
+        if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path):
+            big_npy = np.load(sidecar, mmap_mode="r")
+            if big_npy.shape == (index.ntotal, index.d):
+                with self.lock:
+                    self.sidecar_hits += 1
+                return big_npy
+
+        # Записываем во временный файл и атомарно заменяем, чтобы другие процессы не прочитали неполный файл
+        tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, index.reconstruct_n(0, index.ntotal))
+        os.replace(tmp_path, sidecar)
+        return np.load(sidecar, mmap_mode="r")
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "sidecar_hits": self.sidecar_hits,
+            }
+
+
+_shared_cache = None
+
+
+# Возвращает общий для процесса кэш индексов
+def get_index_cache(max_entries=8, use_mmap=False):
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = IndexCache(max_entries, use_mmap)
+    return _shared_cache
@@ -1,6 +1,8 @@
 import asyncio
 import gc
 import os
+import struct
+from contextlib import contextmanager
 
 import edge_tts
 import gradio as gr
@@ -8,12 +10,17 @@ import torch
 from fairseq.checkpoint_utils import load_model_ensemble_and_task
 from fairseq.data.dictionary import Dictionary
 from pydub import AudioSegment
-from scipy.io import wavfile
 
 from rvc.infer.config import Config
+from rvc.infer.export import build_synthesizer, load_exported
+from rvc.infer.f0_cache import get_f0_cache
+from rvc.infer.feature_cache import file_checksum
+from rvc.infer.index_cache import get_index_cache
+from rvc.infer.model_cache import ModelCache
 from rvc.infer.pipeline import VC
-from rvc.lib.algorithm.synthesizers import Synthesizer
-from rvc.lib.audio import load_audio
+from rvc.infer.streaming import StreamingVC
+from rvc.lib.audio import load_audio, write_audio
+from rvc.lib.predictors.f0 import predictor_pool
 from rvc.modules.audio_upscaler import upscale
 
 # Определяем пути к папкам и файлам (константы)
@@ -27,6 +34,11 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # Инициализация конфигурации
 config = Config()
+# Кэш моделей, общий для всех вызовов rvc_infer в процессе
+model_cache = ModelCache(config.model_cache_mb)
+index_cache = get_index_cache(config.index_cache_size, config.index_mmap)
+f0_cache = get_f0_cache(config.f0_cache_dir, max_disk_mb=config.f0_cache_max_mb) if config.f0_cache else None
+audio_cache_dir = config.audio_cache_dir if config.audio_cache else None
 
 
 # Отображает прогресс выполнения задачи.
@@ -35,31 +47,6 @@ def display_progress(percent, message, is_print, progress=gr.Progress()):
         print(message)
     progress(percent, desc=message)
 
-    # Обновляем глобальный прогресс для веб-интерфейса
-    try:
-        import sys
-
-        sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
-        from web.api import current_conversion_progress
-
-        # Вычисляем текущий шаг на основе процента (всего 8 шагов в rvc_infer)
-        total_steps = 8
-        current_step = min(int(percent * total_steps), total_steps)
-
-        # Обновляем прогресс для веб-интерфейса
-        current_conversion_progress.update(
-            {
-                "progress": percent,
-                "current_step": current_step,
-                "total_steps": total_steps,
-                "step_name": "RVC Inference",
-                "description": message,
-            }
-        )
-    except ImportError:
-        # Если не удается импортировать, просто продолжаем без обновления веб-прогресса
-        pass
-
 
 # Загружает модель RVC и индекс по имени модели.
 def load_rvc_model(rvc_model):
@@ -87,8 +74,12 @@ def load_rvc_model(rvc_model):
 def load_hubert(model_path):
     torch.serialization.add_safe_globals([Dictionary])
     model, _, _ = load_model_ensemble_and_task([model_path], suffix="")
-    hubert = model[0].to(config.device).float()
+    hubert = model[0].to(config.device, config.dtype)
     hubert.eval()
+    # Контрольная сумма весов (и точность) нужна для ключей кэша признаков
+    if config.feature_cache:
+        checksum = file_checksum(model_path)
+        hubert.embedder_checksum = checksum if config.precision == "fp32" else f"{checksum}-{config.precision}"
     return hubert
 
 
@@ -97,33 +88,78 @@ def get_vc(model_path):
     # Загружаем состояние модели из файла
     cpt = torch.load(model_path, map_location="cpu", weights_only=True)
 
-    # Проверяем корректность формата модели
-    if "config" not in cpt or "weight" not in cpt:
-        raise ValueError(f"Некорректный формат для {model_path}. Используйте голосовую модель, обученную на RVC v2.")
+    # Инициализируем синтезатор (или загружаем экспортированный граф для бэкендов onnx/torchscript)
+    if config.backend == "torch":
+        # Весовая нормализация сворачивается в fp32 до приведения к рабочей точности
+        net_g = build_synthesizer(cpt, model_path).optimize_for_inference().to(config.device, config.dtype)
+    else:
+        if "config" not in cpt or "weight" not in cpt:
+            raise ValueError(f"Некорректный формат для {model_path}. Используйте голосовую модель, обученную на RVC v2.")
+        net_g = load_exported(model_path, config.backend, config.backend_threads)
 
     # Извлекаем параметры модели
     tgt_sr = cpt["config"][-1]
-    cpt["config"][-3] = cpt["weight"]["emb_g.weight"].shape[0]
-
     use_f0 = cpt.get("f0", 1)
     version = cpt.get("version", "v1")
-    vocoder = cpt.get("vocoder", "HiFi-GAN")
-    input_dim = 768 if version == "v2" else 256
-
-    # Инициализируем синтезатор
-    net_g = Synthesizer(*cpt["config"], use_f0=use_f0, text_enc_hidden_dim=input_dim, vocoder=vocoder)
-
-    # Удаляем ненужный слой
-    del net_g.enc_q
-    net_g.load_state_dict(cpt["weight"], strict=False)
-    net_g = net_g.to(config.device).float()
-    net_g.eval()
 
     # Инициализируем объект конвертера голоса
     vc = VC(tgt_sr, config)
     return cpt, version, net_g, tgt_sr, vc, use_f0
 
 
+# Получает модель Hubert из кэша (загружает при первом обращении)
+@contextmanager
+def cached_hubert(model_path):
+    key = model_cache.make_key("hubert", model_path, config.device, config.dtype)
+    with model_cache.use(key, lambda: load_hubert(model_path)) as hubert:
+        yield hubert
+
+
+# Получает конвертер голоса из кэша (загружает при первом обращении)
+@contextmanager
+def cached_vc(model_path):
+    def loader():
+        # Исходный чекпоинт не нужен после загрузки весов, поэтому в кэше его не храним
+        _, version, net_g, tgt_sr, vc, use_f0 = get_vc(model_path)
+        return version, net_g, tgt_sr, vc, use_f0
+
+    kind = "vc" if config.backend == "torch" else f"vc-{config.backend}"
+    key = model_cache.make_key(kind, model_path, config.device, config.dtype)
+    with model_cache.use(key, loader) as value:
+        yield value
+
+
+# Открывает потоковый преобразователь для модели (модели берутся из кэша)
+@contextmanager
+def open_stream(rvc_model, index_rate=0, **kwargs):
+    model_path, index_path = load_rvc_model(rvc_model)
+    index = big_npy = None
+    if index_path and index_rate != 0:
+        index, big_npy = index_cache.get(index_path)
+
+    with cached_hubert(HUBERT_BASE_PATH) as hubert_model, cached_vc(model_path) as (version, net_g, tgt_sr, vc, use_f0):
+        yield StreamingVC(
+            hubert_model,
+            net_g,
+            vc,
+            version,
+            use_f0,
+            index=index,
+            big_npy=big_npy,
+            index_rate=index_rate,
+            **kwargs,
+        )
+
+
+# Выгружает все неиспользуемые модели, индексы и предикторы F0 из кэша
+def unload_models():
+    model_cache.clear()
+    index_cache.clear()
+    predictor_pool.unload()
+    if f0_cache is not None:
+        f0_cache.clear()
+
+
 # Конвертируем файл в выбранный пользователем формат
 def convert_audio(input_audio, output_audio, output_format):
     # Загружаем аудиофайл
@@ -164,8 +200,11 @@ def rvc_infer(
     autopitch_threshold=155.0,
     autotune=False,
     autotune_strength=1.0,
+    autotune_scale="chromatic",
+    autotune_key="C",
     output_format="wav",
     audio_upscaling=False,  # FlashSR
+    output_path=None,
     progress=gr.Progress(track_tqdm=True),
 ):
     if not rvc_model:
@@ -173,88 +212,159 @@ def rvc_infer(
     if not os.path.exists(input_path):
         raise ValueError(f"Не удалось найти файл '{input_path}'. Убедитесь, что он загрузился или проверьте правильность пути к нему.")
 
-    # Инициализируем прогресс для веб-интерфейса
-    try:
-        import sys
-
-        sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
-        from web.api import current_conversion_progress
-
-        current_conversion_progress.update(
-            {
-                "progress": 0.0,
-                "current_step": 0,
-                "total_steps": 8,
-                "step_name": "RVC Inference",
-                "description": "Начинаем конвертацию голоса",
-            }
-        )
-    except ImportError:
-        pass
-
-    display_progress(0, "\n[⚙️] Запуск конвейера генерации...", True)
+    display_progress(0, "\n[⚙️] Запуск конвейера генерации...", True, progress)
 
     # Загружаем модель Hubert
-    display_progress(0.1, "Загружаем модель Hubert...", False)
-    hubert_model = load_hubert(HUBERT_BASE_PATH)
+    display_progress(0.1, "Загружаем модель Hubert...", False, progress)
     # Загружаем модель RVC и индекс
-    display_progress(0.2, "Загружаем модель RVC и индекс...", False)
+    display_progress(0.2, "Загружаем модель RVC и индекс...", False, progress)
     model_path, index_path = load_rvc_model(rvc_model)
     # Получаем конвертер голоса
-    display_progress(0.3, "Получаем конвертер голоса...", False)
-    cpt, version, net_g, tgt_sr, vc, use_f0 = get_vc(model_path)
-
-    # Построение имени выходного файла
-    base_name = os.path.splitext(os.path.basename(input_path))[0]
-    if len(base_name) > 50:
-        gr.Warning("Имя файла превышает 50 символов и будет сокращено для удобства использования.")
-        base_name = "Made_in_Mushroom_RVC"  # Сменить имя файла, если длина исходного более 50 символов
-    output_path = os.path.join(OUTPUT_DIR, f"{base_name}_({rvc_model}).{output_format}")
-
-    # Загружаем аудиофайл
-    display_progress(0.4, "Загружаем аудиофайл...", False)
-    audio = load_audio(input_path, 16000)
-
-    display_progress(0.5, f"[🌌] Преобразование аудио — {base_name}...", True)
-    audio_opt = vc.pipeline(
-        hubert_model,
-        net_g,
-        0,
-        audio,
-        0 if autopitch else rvc_pitch,
-        f0_min,
-        f0_max,
-        f0_method,
-        index_path,
-        index_rate,
-        use_f0,
-        volume_envelope,
-        version,
-        protect,
-        autopitch,
-        autopitch_threshold,
-        autotune,
-        autotune_strength,
-    )
+    display_progress(0.3, "Получаем конвертер голоса...", False, progress)
+
+    # Модели берутся из кэша и остаются загруженными для следующих вызовов
+    with cached_hubert(HUBERT_BASE_PATH) as hubert_model, cached_vc(model_path) as (version, net_g, tgt_sr, vc, use_f0):
+        # Построение имени выходного файла (если путь не задан явно)
+        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        if output_path is None:
+            if len(base_name) > 50:
+                gr.Warning("Имя файла превышает 50 символов и будет сокращено для удобства использования.")
+                base_name = "Made_in_Mushroom_RVC"  # Сменить имя файла, если длина исходного более 50 символов
+            output_path = os.path.join(OUTPUT_DIR, f"{base_name}_({rvc_model}).{output_format}")
+
+        # Загружаем аудиофайл
+        display_progress(0.4, "Загружаем аудиофайл...", False, progress)
+        audio = load_audio(input_path, 16000, audio_cache_dir, config.audio_cache_max_mb)
+
+        display_progress(0.5, f"[🌌] Преобразование аудио — {base_name}...", True, progress)
+
+        # Прогресс по сегментам занимает диапазон 0.5–0.8
+        def segment_progress(done, total):
+            display_progress(0.5 + 0.3 * done / total, f"Преобразование аудио — сегмент {done}/{total}", False, progress)
+
+        audio_opt = vc.pipeline(
+            hubert_model,
+            net_g,
+            0,
+            audio,
+            0 if autopitch else rvc_pitch,
+            f0_min,
+            f0_max,
+            f0_method,
+            index_path,
+            index_rate,
+            use_f0,
+            volume_envelope,
+            version,
+            protect,
+            autopitch,
+            autopitch_threshold,
+            autotune,
+            autotune_strength,
+            autotune_scale,
+            autotune_key,
+            progress_callback=segment_progress,
+        )
     # Сохраняем файл и конвертируем его в выбранный формат
-    display_progress(0.8, "[💫] Сохраняем результат...", True)
-    wavfile.write(output_path, tgt_sr, audio_opt)
-    convert_audio(output_path, output_path, output_format)
+    display_progress(0.8, "[💫] Сохраняем результат...", True, progress)
+    # Кодируем сразу в выбранный формат (без промежуточного WAV и повторного декодирования)
+    write_audio(output_path, audio_opt, tgt_sr, output_format)
 
     if audio_upscaling:
-        display_progress(0.9, "[🚀] Улучшение качества аудио...", True)
-        upscale(output_path, OUTPUT_DIR, 2, config.device)
+        display_progress(0.9, "[🚀] Улучшение качества аудио...", True, progress)
+        upscale(output_path, os.path.dirname(output_path), 2, config.device)
 
     # Освобождаем память
-    display_progress(0.95, "Освобождаем память...", False)
-    del hubert_model, cpt, net_g, vc
+    display_progress(0.95, "Освобождаем память...", False, progress)
+    del audio, audio_opt
     gc.collect()
-    torch.cuda.empty_cache()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
 
-    display_progress(1.0, f"[✅] Преобразование завершено — {output_path}", True)
+    display_progress(1.0, f"[✅] Преобразование завершено — {output_path}", True, progress)
     return output_path
 
 
+# Заголовок WAV (PCM 16 бит) для потоковой передачи: длина данных заранее неизвестна, поэтому размеры максимальные
+def wav_stream_header(sample_rate, channels=1, sample_width=2):
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        0xFFFFFFFF,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,
+        channels,
+        sample_rate,
+        sample_rate * channels * sample_width,
+        channels * sample_width,
+        sample_width * 8,
+        b"data",
+        0xFFFFFFFF,
+    )
+
+
+# Потоковый инференс: генератор байтов WAV, сегменты выдаются по мере преобразования
+def rvc_infer_stream(
+    rvc_model=None,
+    input_path=None,
+    f0_method="rmvpe",
+    f0_min=50,
+    f0_max=1100,
+    rvc_pitch=0,
+    protect=0.5,
+    index_rate=0,
+    volume_envelope=1,
+    autopitch=False,
+    autopitch_threshold=155.0,
+    autotune=False,
+    autotune_strength=1.0,
+    autotune_scale="chromatic",
+    autotune_key="C",
+):
+    """
+    Первым выдается заголовок WAV (после загрузки моделей), затем PCM 16 бит каждого
+    сегмента VC.pipeline. Воспроизведение можно начинать после первого сегмента.
+    Модели остаются занятыми в кэше, пока генератор не будет исчерпан или закрыт.
+    """
+    if not rvc_model:
+        raise ValueError("Выберите модель голоса для преобразования.")
+    if not os.path.exists(input_path):
+        raise ValueError(f"Не удалось найти файл '{input_path}'. Убедитесь, что он загрузился или проверьте правильность пути к нему.")
+
+    model_path, index_path = load_rvc_model(rvc_model)
+    with cached_hubert(HUBERT_BASE_PATH) as hubert_model, cached_vc(model_path) as (version, net_g, tgt_sr, vc, use_f0):
+        audio = load_audio(input_path, 16000, audio_cache_dir, config.audio_cache_max_mb)
+        yield wav_stream_header(tgt_sr)
+
+        segments = vc.pipeline(
+            hubert_model,
+            net_g,
+            0,
+            audio,
+            0 if autopitch else rvc_pitch,
+            f0_min,
+            f0_max,
+            f0_method,
+            index_path,
+            index_rate,
+            use_f0,
+            volume_envelope,
+            version,
+            protect,
+            autopitch,
+            autopitch_threshold,
+            autotune,
+            autotune_strength,
+            autotune_scale,
+            autotune_key,
+            stream=True,
+        )
+        for segment in segments:
+            yield (segment * 32767).astype("<i2").tobytes()
+
+
 def rvc_edgetts_infer(
     # RVC
     rvc_model=None,
@@ -269,6 +379,8 @@ def rvc_edgetts_infer(
     autopitch_threshold=155.0,
     autotune=False,
     autotune_strength=1.0,
+    autotune_scale="chromatic",
+    autotune_key="C",
     output_format="wav",
     # EdgeTTS
     tts_voice=None,
@@ -285,26 +397,7 @@ def rvc_edgetts_infer(
     if not tts_voice:
         raise ValueError("Выберите язык и голос для синтеза речи.")
 
-    # Инициализируем прогресс для веб-интерфейса
-    try:
-        import sys
-
-        sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
-        from web.api import current_conversion_progress
-
-        current_conversion_progress.update(
-            {
-                "progress": 0.0,
-                "current_step": 0,
-                "total_steps": 9,  # 1 шаг TTS + 8 шагов RVC
-                "step_name": "TTS + RVC Inference",
-                "description": "Начинаем синтез речи и конвертацию голоса",
-            }
-        )
-    except ImportError:
-        pass
-
-    display_progress(0.1, "[🎙️] Синтезируем речь...", False)
+    display_progress(0.1, "[🎙️] Синтезируем речь...", False, progress)
     input_path = os.path.join(OUTPUT_DIR, "TTS_Voice.wav")
     asyncio.run(text_to_speech(tts_voice, tts_text, tts_rate, tts_volume, tts_pitch, input_path))
 
@@ -322,8 +415,11 @@ def rvc_edgetts_infer(
         autopitch_threshold=autopitch_threshold,
         autotune=autotune,
         autotune_strength=autotune_strength,
+        autotune_scale=autotune_scale,
+        autotune_key=autotune_key,
         output_format=output_format,
         audio_upscaling=audio_upscaling,
+        progress=progress,
     )
 
     return input_path, output_path
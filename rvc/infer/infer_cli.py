@@ -16,7 +16,10 @@ os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 logging.basicConfig(level=logging.WARNING)
 warnings.filterwarnings("ignore")
 
-from rvc.infer.infer import rvc_edgetts_infer, rvc_infer
+from rvc.infer.batch import run_batch
+from rvc.infer.export import EXPORT_FORMATS, benchmark_synthesizer, export_model
+from rvc.infer.infer import OUTPUT_DIR, load_rvc_model, rvc_edgetts_infer, rvc_infer
+from rvc.lib.predictors.f0 import NOTE_NAMES, SCALES
 
 
 def create_parser():
@@ -34,6 +37,8 @@ def create_parser():
     base.add_argument("--autopitch_threshold", type=float, default=155.0, help="155.0 — Мужская модель | 255.0 — Женская модель")
     base.add_argument("--autotune", type=lambda x: bool(strtobool(x)), default=False, help="Коррекция высоты тона")
     base.add_argument("--autotune_strength", type=float, default=1.0, help="Сила автотюна")
+    base.add_argument("--autotune_scale", type=str, default="chromatic", choices=list(SCALES), help="Гамма автотюна")
+    base.add_argument("--autotune_key", type=str, default="C", choices=NOTE_NAMES, help="Тональность автотюна")
     base.add_argument("--upscale", type=lambda x: bool(strtobool(x)), default=False, help="Улучшение качества звука")
     base.add_argument("--output_format", type=str, default="mp3", help="Формат выходного файла")
 
@@ -53,6 +58,32 @@ def create_parser():
     edge_tts.add_argument("--tts_volume", type=int, default=0, help="Громкость синтеза речи")
     edge_tts.add_argument("--tts_pitch", type=int, default=0, help="Высота тона синтеза речи")
 
+    # Субкоманда для пакетной конвертации
+    batch = subparsers.add_parser("batch", parents=[base], help="Пакетная конвертация папки или списка файлов")
+    batch.add_argument("--input_path", type=str, required=True, help="Папка с аудио-файлами или файл-манифест (один путь на строку)")
+    batch.add_argument("--output_dir", type=str, default=os.path.join(OUTPUT_DIR, "batch"), help="Папка для результатов")
+    batch.add_argument("--workers", type=int, default=1, help="Количество рабочих процессов")
+    batch.add_argument("--report", type=str, default=None, help="Путь к JSONL-отчету (по умолчанию batch_report.jsonl в папке результатов)")
+    batch.add_argument(
+        "--index_mmap",
+        type=lambda x: bool(strtobool(x)),
+        default=None,
+        help="Открывать индексы FAISS через memory-map (по умолчанию включено при нескольких процессах)",
+    )
+
+    # Субкоманда для экспорта синтезатора
+    export = subparsers.add_parser("export", help="Экспорт голосовой модели в ONNX или TorchScript (экспериментально)")
+    export.add_argument("--rvc_model", type=str, required=True, help="Название RVC модели")
+    export.add_argument("--format", type=str, default="onnx", choices=EXPORT_FORMATS, help="Формат экспорта")
+    export.add_argument("--output_path", type=str, default=None, help="Путь к экспортированной модели (по умолчанию рядом с .pth)")
+    export.add_argument("--opset", type=int, default=17, help="Версия opset ONNX")
+
+    # Субкоманда для замера скорости синтезатора
+    benchmark = subparsers.add_parser("benchmark", help="Замер скорости синтеза сегмента (weight norm / свернутая / TorchScript)")
+    benchmark.add_argument("--rvc_model", type=str, required=True, help="Название RVC модели")
+    benchmark.add_argument("--seconds", type=float, default=10.0, help="Длина сегмента в секундах")
+    benchmark.add_argument("--runs", type=int, default=5, help="Количество прогонов")
+
     return parser
 
 
@@ -60,6 +91,15 @@ def main():
     parser = create_parser()
     args = parser.parse_args()
 
+    if args.command == "export":
+        model_path, _ = load_rvc_model(args.rvc_model)
+        export_model(model_path, args.format, args.output_path, args.opset)
+        return
+    if args.command == "benchmark":
+        model_path, _ = load_rvc_model(args.rvc_model)
+        benchmark_synthesizer(model_path, args.seconds, args.runs)
+        return
+
     common_params = {
         "rvc_model": args.rvc_model,
         "f0_method": args.f0_method,
@@ -73,10 +113,18 @@ def main():
         "autopitch_threshold": args.autopitch_threshold,
         "autotune": args.autotune,
         "autotune_strength": args.autotune_strength,
+        "autotune_scale": args.autotune_scale,
+        "autotune_key": args.autotune_key,
         "output_format": args.output_format,
         "audio_upscaling": args.upscale,
     }
 
+    if args.command == "batch":
+        counts = run_batch(args.input_path, args.output_dir, args.report, args.workers, args.index_mmap, **common_params)
+        if counts["error"]:
+            print(f"\033[91m\nНе удалось конвертировать файлов: {counts['error']}. Подробности в отчете.\033[0m")
+        return
+
     if args.command == "rvc":
         rvc_infer(**common_params, input_path=args.input_path)
     elif args.command == "tts":
@@ -0,0 +1,163 @@
+import gc
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import torch
+
+
+# Оценивает объем памяти, занимаемый объектом, в байтах
+def estimate_size(value):
+    if isinstance(value, torch.nn.Module):
+        tensors = list(value.parameters()) + list(value.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sum(estimate_size(v) for v in value.values())
+    return 0
+
+
+# Запись в кэше моделей
+class CacheEntry:
+    def __init__(self, key, value, size):
+        self.key = key
+        self.value = value
+        self.size = size
+        self.refcount = 0
+
+
+# Процессный реестр загруженных моделей с LRU-вытеснением и подсчетом ссылок
+class ModelCache:
+    def __init__(self, max_memory_mb=4096):
+        """
+        Инициализация кэша моделей.
+
+        Модели, которые сейчас используются (refcount > 0), никогда не вытесняются,
+        поэтому фактический объем может временно превышать бюджет.
+        """
+        self.max_memory = int(max_memory_mb * 1024 * 1024)
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
+        # Ключи, загружаемые в данный момент, и события окончания их загрузки
+        self.loading = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(kind, path, device, dtype):
+        """
+        Формирует ключ кэша: (тип, путь, время изменения, устройство, тип данных).
+        """
+        path = os.path.realpath(path)
+        return (kind, path, os.path.getmtime(path), str(device), str(dtype))
+
+    @property
+    def memory_used(self):
+        return sum(entry.size for entry in self.entries.values())
+
+    def acquire(self, key, loader):
+        """
+        Возвращает объект из кэша, при необходимости загружая его через loader().
+        Каждый вызов acquire должен сопровождаться вызовом release.
+
+        loader() выполняется без удержания блокировки, поэтому загрузка одной модели
+        не задерживает обращения к другим. Потоки, запросившие ту же модель во время
+        загрузки, ждут ее завершения вместо повторной загрузки.
+        """
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    return self._take(entry)
+                loading = self.loading.get(key)
+                if loading is None:
+                    self.misses += 1
+                    # Устаревшие версии того же файла (другое mtime) больше не понадобятся
+                    self._drop_stale(key)
+                    loading = self.loading[key] = threading.Event()
+                    break
+            # Если загрузка в другом потоке завершилась ошибкой, записи не будет и этот поток загрузит модель сам
+            loading.wait()
+
+        try:
+            value = loader()
+            entry = CacheEntry(key, value, estimate_size(value))
+            with self.lock:
+                self.entries[key] = entry
+                return self._take(entry)
+        finally:
+            with self.lock:
+                del self.loading[key]
+            loading.set()
+
+    def release(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.refcount > 0:
+                entry.refcount -= 1
+            self._evict()
+
+    @contextmanager
+    def use(self, key, loader):
+        value = self.acquire(key, loader)
+        try:
+            yield value
+        finally:
+            self.release(key)
+
+    def clear(self):
+        """
+        Выгружает все неиспользуемые модели.
+        """
+        with self.lock:
+            for key in [k for k, e in self.entries.items() if e.refcount == 0]:
+                del self.entries[key]
+        self._free_memory()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "memory_used_mb": self.memory_used / 1024 / 1024,
+                "max_memory_mb": self.max_memory / 1024 / 1024,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _take(self, entry):
+        self.entries.move_to_end(entry.key)
+        entry.refcount += 1
+        self._evict()
+        return entry.value
+
+    def _drop_stale(self, key):
+        kind, path, _, device, dtype = key
+        for other in list(self.entries):
+            entry = self.entries[other]
+            if other[0] == kind and other[1] == path and other[3:] == (device, dtype) and entry.refcount == 0:
+                del self.entries[other]
+
+    def _evict(self):
+        evicted = False
+        while self.memory_used > self.max_memory:
+            # Самые давно использованные записи находятся в начале OrderedDict
+            victim = next((k for k, e in self.entries.items() if e.refcount == 0), None)
+            if victim is None:
+                break
+            del self.entries[victim]
+            evicted = True
+        if evicted:
+            self._free_memory()
+
+    @staticmethod
+    def _free_memory():
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
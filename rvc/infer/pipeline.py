@@ -1,6 +1,6 @@
 import os
+import threading
 
-import faiss
 import librosa
 import numpy as np
 import torch
@@ -8,7 +8,10 @@ import torch.nn.functional as F
 from scipy import signal
 from tqdm import tqdm
 
-from rvc.lib.predictors.f0 import CREPE, FCPE, RMVPE, AutoTune, calc_pitch_shift
+from rvc.infer.f0_cache import get_f0_cache
+from rvc.infer.feature_cache import get_feature_cache
+from rvc.infer.index_cache import get_index_cache
+from rvc.lib.predictors.f0 import AutoTune, calc_pitch_shift, predictor_pool
 
 # Фильтр Баттерворта для высоких частот
 bh, ah = signal.butter(N=5, Wn=48, btype="high", fs=16000)
@@ -56,7 +59,57 @@ class VC:
         self.t_max = self.sample_rate * self.x_max
         self.time_step = self.window / self.sample_rate * 1000
         self.device = config.device
+        self.dtype = config.dtype
+        self.precision = config.precision
+        self.backend = config.backend
+        self.batch_size = max(1, config.batch_size)
         self.autotune = AutoTune()
+        self.index_cache = get_index_cache(config.index_cache_size, config.index_mmap)
+        self.f0_cache = get_f0_cache(config.f0_cache_dir, max_disk_mb=config.f0_cache_max_mb) if config.f0_cache else None
+        self.feature_cache = get_feature_cache(config.feature_cache_dir, config.feature_cache_max_mb) if config.feature_cache else None
+        # Рабочие буферы смешивания с индексом; VC из кэша моделей может использоваться несколькими потоками
+        self.blend_buffers = threading.local()
+
+    def get_blend_buffers(self, rows, dim, dtype):
+        buffers = getattr(self.blend_buffers, "arrays", None)
+        if buffers is not None and (buffers[0].shape[1] != dim or buffers[0].dtype != dtype):
+            buffers = None
+        if buffers is None or buffers[0].shape[0] < rows:
+            # Запас по длине, чтобы не выделять память заново для чуть более длинного сегмента
+            capacity = max(rows, 0 if buffers is None else buffers[0].shape[0] * 2)
+            buffers = (np.empty((capacity, dim), dtype=dtype), np.empty((capacity, dim), dtype=dtype))
+            self.blend_buffers.arrays = buffers
+        return buffers[0][:rows], buffers[1][:rows]
+
+    def blend_index(self, feats, index, big_npy, k=8):
+        """
+        Признаки из индекса: сумма k ближайших векторов big_npy с весами 1/d², нормированными по строке.
+        Векторы соседей собираются по одному столбцу в переиспользуемые буферы, без массива (T, k, d).
+        Результат — представление буфера, действительное до следующего вызова в этом потоке.
+        """
+        score, ix = index.search(feats, k=k)
+        # Точное совпадение (d=0) дает бесконечный вес, поэтому расстояние ограничено снизу;
+        # отсутствующие соседи (ix=-1, например при малом nprobe) получают нулевой вес
+        missing = ix < 0
+        weight = np.square(1 / np.maximum(score, 1e-6))
+        weight[missing] = 0
+        ix[missing] = 0
+        total = weight.sum(axis=1, keepdims=True)
+        weight /= np.maximum(total, 1e-12)
+
+        out, gathered = self.get_blend_buffers(feats.shape[0], big_npy.shape[1], big_npy.dtype)
+        np.take(big_npy, ix[:, 0], axis=0, out=out)
+        out *= weight[:, :1]
+        for j in range(1, k):
+            np.take(big_npy, ix[:, j], axis=0, out=gathered)
+            gathered *= weight[:, j : j + 1]
+            out += gathered
+
+        # Для кадров без найденных соседей оставляем исходные признаки
+        empty = total[:, 0] == 0
+        if empty.any():
+            out[empty] = feats[empty]
+        return out
 
     def get_f0(
         self,
@@ -70,37 +123,70 @@ class VC:
         autopitch_threshold,
         autotune,
         autotune_strength,
+        autotune_scale="chromatic",
+        autotune_key="C",
     ):
         """
         Получает F0 с использованием выбранного метода.
         """
-        f0 = None
-        f0_mel_min = 1127 * np.log(1 + f0_min / 700)
-        f0_mel_max = 1127 * np.log(1 + f0_max / 700)
+        f0 = self.compute_f0(audio, p_len, f0_min, f0_max, f0_method)
+        return self.process_f0(
+            f0, pitch, f0_min, f0_max, autopitch, autopitch_threshold, autotune, autotune_strength, autotune_scale, autotune_key
+        )
+
+    def compute_f0(self, audio, p_len, f0_min, f0_max, f0_method, use_cache=True):
+        """
+        Вычисляет исходный F0 (до автотюна и сдвига высоты тона).
+        """
+        key = None
+        if use_cache and self.f0_cache is not None:
+            # F0 из RMVPE зависит от точности модели, поэтому она входит в ключ
+            method_key = f0_method if self.precision == "fp32" else f"{f0_method}-{self.precision}"
+            key = self.f0_cache.make_key(audio, method_key, f0_min, f0_max, self.window)
+            f0 = self.f0_cache.get(key)
+            if f0 is not None:
+                return f0
 
+        f0 = None
+        model = predictor_pool.get(f0_method, self.device, self.dtype)
         if f0_method == "crepe":
-            model = CREPE(device=self.device, sample_rate=self.sample_rate, hop_size=self.window)
             f0 = model.get_f0(audio, f0_min, f0_max, p_len, "full")
-            del model
         elif f0_method == "crepe-tiny":
-            model = CREPE(device=self.device, sample_rate=self.sample_rate, hop_size=self.window)
             f0 = model.get_f0(audio, f0_min, f0_max, p_len, "tiny")
-            del model
         elif f0_method == "fcpe":
-            model = FCPE(device=self.device, sample_rate=self.sample_rate, hop_size=self.window)
             f0 = model.get_f0(audio, p_len)
-            del model
         elif f0_method in ("rmvpe", "rmvpe+"):
-            model = RMVPE(device=self.device, sample_rate=self.sample_rate)
             f0 = model.get_f0(audio, f0_method)
-            del model
 
         if f0 is None:
             raise ValueError("Метод F0 не распознан или не смог рассчитать F0.")
 
+        if key is not None:
+            self.f0_cache.put(key, f0)
+        return f0
+
+    def process_f0(
+        self,
+        f0,
+        pitch,
+        f0_min,
+        f0_max,
+        autopitch,
+        autopitch_threshold,
+        autotune,
+        autotune_strength,
+        autotune_scale="chromatic",
+        autotune_key="C",
+    ):
+        """
+        Применяет автотюн, сдвиг высоты тона и квантование к исходному F0.
+        """
+        f0_mel_min = 1127 * np.log(1 + f0_min / 700)
+        f0_mel_max = 1127 * np.log(1 + f0_max / 700)
+
         # АвтоТюн (коррекция высоты тона)
         if autotune is True:
-            f0 = self.autotune.autotune_f0(f0, autotune_strength)
+            f0 = self.autotune.autotune_f0(f0, autotune_strength, autotune_scale, autotune_key)
 
         # АвтоПитч (автоматическое определение высоты тона)
         if autopitch is True:
@@ -128,50 +214,84 @@ class VC:
         index_rate,
         version,
         protect,
+        use_cache=True,
     ):
         """
         Преобразует аудио с использованием модели.
         """
-        feats = torch.from_numpy(audio0).float()
-        if feats.dim() == 2:
-            feats = feats.mean(-1)
-        assert feats.dim() == 1, feats.dim()
-        feats = feats.view(1, -1)
-        padding_mask = torch.BoolTensor(feats.shape).to(self.device).fill_(False)
-
-        inputs = {
-            "source": feats.to(self.device),
-            "padding_mask": padding_mask,
-            "output_layer": 9 if version == "v1" else 12,
-        }
+        hasp = pitch is not None and pitchf is not None
+        return self.vc_batch(
+            model,
+            net_g,
+            sid,
+            [audio0],
+            [pitch[0]] if hasp else None,
+            [pitchf[0]] if hasp else None,
+            index,
+            big_npy,
+            index_rate,
+            version,
+            protect,
+            use_cache,
+        )[0]
+
+    def vc_batch(
+        self,
+        model,
+        net_g,
+        sid,
+        audios,
+        pitches,
+        pitchfs,
+        index,
+        big_npy,
+        index_rate,
+        version,
+        protect,
+        use_cache=True,
+    ):
+        """
+        Преобразует несколько сегментов аудио за один проход синтезатора.
+        Признаки HuBERT извлекаются для каждого сегмента отдельно, затем дополняются
+        нулями до общей длины, а лишние кадры маскируются.
+        """
+        hasp = pitches is not None and pitchfs is not None
+        batch = len(audios)
+        lengths = [audio0.shape[0] for audio0 in audios]
 
-        with torch.no_grad():
-            logits = model.extract_features(**inputs)
-            feats = model.final_proj(logits[0]) if version == "v1" else logits[0]
+        features = self.extract_features(model, audios, version, use_cache)
+        feat_lengths = torch.tensor([f.shape[0] for f in features], device=self.device)
+        feats = torch.nn.utils.rnn.pad_sequence(features, batch_first=True)
 
-        if protect < 0.5 and pitch is not None and pitchf is not None:
+        if protect < 0.5 and hasp:
             feats0 = feats.clone()
 
         if index is not None and big_npy is not None and index_rate != 0:
-            npy = feats[0].cpu().numpy()
-            score, ix = index.search(npy, k=8)
-            weight = np.square(1 / score)
-            weight /= weight.sum(axis=1, keepdims=True)
-            npy = np.sum(big_npy[ix] * np.expand_dims(weight, axis=2), axis=1)
-            feats = torch.from_numpy(npy).unsqueeze(0).to(self.device) * index_rate + (1 - index_rate) * feats
+            valid = torch.arange(feats.shape[1], device=feats.device).unsqueeze(0) < feat_lengths.unsqueeze(1)
+            npy = self.blend_index(feats[valid].float().cpu().numpy(), index, big_npy)
+            retrieved = feats.clone()
+            retrieved[valid] = torch.from_numpy(npy).to(self.device, retrieved.dtype)
+            feats = retrieved * index_rate + (1 - index_rate) * feats
 
         feats = F.interpolate(feats.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)
-        if protect < 0.5 and pitch is not None and pitchf is not None:
+        if protect < 0.5 and hasp:
             feats0 = F.interpolate(feats0.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)
 
-        p_len = audio0.shape[0] // self.window
-        if feats.shape[1] < p_len:
-            p_len = feats.shape[1]
-            if pitch is not None and pitchf is not None:
-                pitch = pitch[:, :p_len]
-                pitchf = pitchf[:, :p_len]
-
-        if protect < 0.5 and pitch is not None and pitchf is not None:
+        p_lens = [min(length // self.window, int(n) * 2) for length, n in zip(lengths, feat_lengths.tolist())]
+        p_len = max(p_lens)
+        feats = feats[:, :p_len]
+
+        pitch = pitchf = None
+        if hasp:
+            pitch = torch.zeros(batch, p_len, dtype=torch.long, device=self.device)
+            pitchf = torch.zeros(batch, p_len, dtype=torch.float32, device=self.device)
+            for i in range(batch):
+                n = min(p_lens[i], pitches[i].shape[0], pitchfs[i].shape[0])
+                pitch[i, :n] = pitches[i][:n]
+                pitchf[i, :n] = pitchfs[i][:n]
+
+        if protect < 0.5 and hasp:
+            feats0 = feats0[:, :p_len]
             pitchff = pitchf.clone()
             pitchff[pitchf > 0] = 1
             pitchff[pitchf < 1] = protect
@@ -179,19 +299,94 @@ class VC:
             feats = feats * pitchff + feats0 * (1 - pitchff)
             feats = feats.to(feats0.dtype)
 
-        p_len = torch.tensor([p_len], device=self.device).long()
+        p_len_tensor = torch.tensor(p_lens, device=self.device).long()
+        sid = sid.repeat(batch)
         with torch.no_grad():
-            hasp = pitch is not None and pitchf is not None
-            arg = (feats.float(), p_len, pitch, pitchf.float(), sid) if hasp else (feats.float(), p_len, sid)
-            audio1 = (net_g.infer(*arg)[0][0, 0]).data.cpu().float().numpy()
-            del hasp, arg
-
-        if protect < 0.5 and pitch is not None and pitchf is not None:
+            # pitchf остается в fp32: фаза синусного генератора накапливается в полной точности
+            if self.backend == "torch":
+                feats = feats.to(self.dtype)
+                arg = (feats, p_len_tensor, pitch, pitchf.float(), sid) if hasp else (feats, p_len_tensor, sid)
+                audio1 = net_g.infer(*arg)[0][:, 0].data.cpu().float().numpy()
+            else:
+                # Экспортированные графы (onnx, torchscript) исполняются на CPU в fp32
+                arg = (feats, p_len_tensor, pitch, pitchf, sid) if hasp else (feats, p_len_tensor, sid)
+                arg = tuple(a.cpu().float() if a.is_floating_point() else a.cpu() for a in arg)
+                audio1 = net_g(*arg)[:, 0].cpu().float().numpy()
+            del arg
+
+        # Обрезаем каждый сегмент до его собственной длины
+        upp = audio1.shape[-1] // p_len
+        audio_opt = [audio1[i, : p_lens[i] * upp] for i in range(batch)]
+
+        if protect < 0.5 and hasp:
             del feats0
-        del feats, padding_mask
+        del feats, features, audio1
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
-        return audio1
+        return audio_opt
+
+    def extract_features(self, model, audios, version, use_cache=True):
+        """
+        Извлекает признаки HuBERT для каждого сегмента (список тензоров [кадры, каналы]).
+        Сегменты, найденные в кэше признаков, не проходят через HuBERT.
+        """
+        output_layer = 9 if version == "v1" else 12
+        checksum = getattr(model, "embedder_checksum", None)
+        use_cache = use_cache and self.feature_cache is not None and checksum is not None
+
+        features = [None] * len(audios)
+        keys = [None] * len(audios)
+        if use_cache:
+            for i, audio0 in enumerate(audios):
+                keys[i] = self.feature_cache.make_key(audio0, checksum, output_layer)
+                cached = self.feature_cache.get(keys[i])
+                if cached is not None:
+                    features[i] = torch.from_numpy(np.asarray(cached, dtype=np.float32)).to(self.device, self.dtype)
+
+        # HuBERT запускается по одному сегменту: групповая нормализация сверточного экстрактора
+        # считает статистику по всей длине входа, и нулевое дополнение до общей длины меняло бы признаки
+        for i, f in enumerate(features):
+            if f is not None:
+                continue
+            feats = torch.from_numpy(audios[i]).float()
+            if feats.dim() == 2:
+                feats = feats.mean(-1)
+            assert feats.dim() == 1, feats.dim()
+            feats = feats.view(1, -1)
+            padding_mask = torch.BoolTensor(feats.shape).to(self.device).fill_(False)
+
+            inputs = {
+                "source": feats.to(self.device, self.dtype),
+                "padding_mask": padding_mask,
+                "output_layer": output_layer,
+            }
+
+            with torch.no_grad():
+                logits = model.extract_features(**inputs)
+                feats = model.final_proj(logits[0]) if version == "v1" else logits[0]
+
+            features[i] = feats[0]
+            if use_cache:
+                self.feature_cache.put(keys[i], features[i].float().cpu().numpy())
+            del padding_mask, logits
+
+        return features
+
+    def get_split_points(self, audio_pad, audio_len):
+        """
+        Находит точки разреза вблизи каждого t_center: позиции с минимальной
+        по модулю суммой сигнала в скользящем окне self.window.
+        """
+        # Сумма в окне считается в float64 заново для каждой точки, по отрезку вокруг t:
+        # кумулятивная сумма по всему сигналу теряла точность на почти тихих участках
+        opt_ts = []
+        for t in range(self.t_center, audio_len, self.t_center):
+            start = t - self.t_query
+            segment = audio_pad[start : t + self.t_query + self.window - 1].astype(np.float64)
+            cumsum = np.concatenate(([0.0], np.cumsum(segment)))
+            abs_sum = np.abs(cumsum[self.window :] - cumsum[: -self.window])[: audio_len - start]
+            opt_ts.append(start + int(abs_sum.argmin()))
+        return opt_ts
 
     def pipeline(
         self,
@@ -213,36 +408,107 @@ class VC:
         autopitch_threshold,
         autotune,
         autotune_strength,
+        autotune_scale="chromatic",
+        autotune_key="C",
+        progress_callback=None,
+        stream=False,
     ):
         """
         Основной конвейер для преобразования аудио.
+        progress_callback(готово, всего) вызывается после каждого обработанного пакета сегментов.
+
+        При stream=True возвращает генератор, выдающий преобразованные сегменты по мере
+        готовности. Огибающая громкости в этом режиме применяется к каждому сегменту
+        отдельно, а вместо нормализации по пику всего файла выход ограничивается до [-1, 1].
+        """
+        audio = signal.filtfilt(bh, ah, audio)
+        segments = self.convert_segments(
+            model,
+            net_g,
+            sid,
+            audio,
+            pitch,
+            f0_min,
+            f0_max,
+            f0_method,
+            file_index,
+            index_rate,
+            pitch_guidance,
+            version,
+            protect,
+            autopitch,
+            autopitch_threshold,
+            autotune,
+            autotune_strength,
+            autotune_scale,
+            autotune_key,
+            progress_callback,
+        )
+        if stream:
+            return self.stream_segments(segments, volume_envelope)
+
+        audio_opt = np.concatenate([segment for _, segment in segments])
+        if volume_envelope != 1:
+            audio_opt = AudioProcessor.change_rms(audio, self.sample_rate, audio_opt, self.tgt_sr, volume_envelope)
+
+        audio_max = np.abs(audio_opt).max() / 0.99
+        if audio_max > 1:
+            audio_opt /= audio_max
+
+        return audio_opt
+
+    def stream_segments(self, segments, volume_envelope):
+        """
+        Генератор готовых к воспроизведению сегментов (float32, частота tgt_sr).
+        """
+        for source, segment in segments:
+            if volume_envelope != 1:
+                segment = AudioProcessor.change_rms(source, self.sample_rate, segment, self.tgt_sr, volume_envelope)
+            yield np.clip(segment, -1.0, 1.0).astype(np.float32)
+
+    def convert_segments(
+        self,
+        model,
+        net_g,
+        sid,
+        audio,
+        pitch,
+        f0_min,
+        f0_max,
+        f0_method,
+        file_index,
+        index_rate,
+        pitch_guidance,
+        version,
+        protect,
+        autopitch,
+        autopitch_threshold,
+        autotune,
+        autotune_strength,
+        autotune_scale="chromatic",
+        autotune_key="C",
+        progress_callback=None,
+    ):
+        """
+        Генератор пар (участок входа 16 кГц, преобразованный сегмент) в порядке следования.
+        audio должен быть уже отфильтрован (filtfilt), тон извлекается по всему входу
+        до выдачи первого сегмента.
         """
         index = big_npy = None
         if file_index and os.path.exists(file_index) and index_rate != 0:
             try:
-                index = faiss.read_index(file_index)
-                big_npy = index.reconstruct_n(0, index.ntotal)
+                index, big_npy = self.index_cache.get(file_index)
             except Exception as error:
                 print(f"Произошла ошибка при чтении индекса FAISS: {error}")
 
         opt_ts = []
-        audio = signal.filtfilt(bh, ah, audio)
         audio_pad = np.pad(audio, (self.window // 2, self.window // 2), mode="reflect")
 
         if audio_pad.shape[0] > self.t_max:
-            audio_sum = np.zeros_like(audio)
-
-            for i in range(self.window):
-                audio_sum += audio_pad[i : i - self.window]
-
-            for t in range(self.t_center, audio.shape[0], self.t_center):
-                segment = audio_sum[t - self.t_query : t + self.t_query]
-                min_index = np.where(np.abs(segment) == np.abs(segment).min())[0][0]
-                opt_ts.append(t - self.t_query + min_index)
+            opt_ts = self.get_split_points(audio_pad, audio.shape[0])
 
         s = 0
         t = None
-        audio_opt = []
         audio_pad = np.pad(audio, (self.t_pad, self.t_pad), mode="reflect")
         p_len = audio_pad.shape[0] // self.window
         sid = torch.tensor(sid, device=self.device).unsqueeze(0).long()
@@ -260,6 +526,8 @@ class VC:
                 autopitch_threshold,
                 autotune,
                 autotune_strength,
+                autotune_scale,
+                autotune_key,
             )
             pitch = pitch[:p_len]
             pitchf = pitchf[:p_len]
@@ -270,61 +538,47 @@ class VC:
             pitch_tensor = torch.tensor(pitch, device=self.device).unsqueeze(0).long()
             pitchf_tensor = torch.tensor(pitchf, device=self.device).unsqueeze(0).float()
 
-        for t in tqdm(opt_ts, desc="Конвертация"):
+        # Для каждого сегмента запоминаем соответствующий ему участок входа (без полей t_pad)
+        audio_segments, source_segments, pitch_segments, pitchf_segments = [], [], [], []
+        for t in opt_ts:
             t = t // self.window * self.window
 
-            audio_segment = audio_pad[s : t + self.t_pad2 + self.window]
-            pitch_segment = pitch_tensor[:, s // self.window : (t + self.t_pad2) // self.window] if pitch_guidance else None
-            pitchf_segment = pitchf_tensor[:, s // self.window : (t + self.t_pad2) // self.window] if pitch_guidance else None
+            audio_segments.append(audio_pad[s : t + self.t_pad2 + self.window])
+            source_segments.append(audio[s : t + self.window])
+            if pitch_guidance:
+                pitch_segments.append(pitch_tensor[0, s // self.window : (t + self.t_pad2) // self.window])
+                pitchf_segments.append(pitchf_tensor[0, s // self.window : (t + self.t_pad2) // self.window])
+            s = t
 
-            audio_opt.append(
-                self.vc(
+        audio_segments.append(audio_pad[t:])
+        source_segments.append(audio[t:] if t is not None else audio)
+        if pitch_guidance:
+            pitch_segments.append(pitch_tensor[0, t // self.window :] if t is not None else pitch_tensor[0])
+            pitchf_segments.append(pitchf_tensor[0, t // self.window :] if t is not None else pitchf_tensor[0])
+
+        # Сегменты обрабатываются пакетами по batch_size, что ограничивает пиковое потребление памяти
+        try:
+            for i in tqdm(range(0, len(audio_segments), self.batch_size), desc="Конвертация"):
+                batch = slice(i, i + self.batch_size)
+                audio_batch = self.vc_batch(
                     model,
                     net_g,
                     sid,
-                    audio_segment,
-                    pitch_segment,
-                    pitchf_segment,
+                    audio_segments[batch],
+                    pitch_segments[batch] if pitch_guidance else None,
+                    pitchf_segments[batch] if pitch_guidance else None,
                     index,
                     big_npy,
                     index_rate,
                     version,
                     protect,
-                )[self.t_pad_tgt : -self.t_pad_tgt]
-            )
-            s = t
-
-        pitch_segment = pitch_tensor[:, t // self.window :] if pitch_guidance and t is not None else pitch_tensor
-        pitchf_segment = pitchf_tensor[:, t // self.window :] if pitch_guidance and t is not None else pitchf_tensor
-
-        audio_opt.append(
-            self.vc(
-                model,
-                net_g,
-                sid,
-                audio_pad[t:],
-                pitch_segment,
-                pitchf_segment,
-                index,
-                big_npy,
-                index_rate,
-                version,
-                protect,
-            )[self.t_pad_tgt : -self.t_pad_tgt]
-        )
-
-        audio_opt = np.concatenate(audio_opt)
-        if volume_envelope != 1:
-            audio_opt = AudioProcessor.change_rms(audio, self.sample_rate, audio_opt, self.tgt_sr, volume_envelope)
-
-        audio_max = np.abs(audio_opt).max() / 0.99
-        if audio_max > 1:
-            audio_opt /= audio_max
-
-        if pitch_guidance:
-            del pitch_tensor, pitchf_tensor
-        del sid
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-
-        return audio_opt
+                )
+                if progress_callback is not None:
+                    progress_callback(min(i + self.batch_size, len(audio_segments)), len(audio_segments))
+                for source, segment in zip(source_segments[batch], audio_batch):
+                    yield source, segment[self.t_pad_tgt : -self.t_pad_tgt]
+        finally:
+            # Выполняется и при досрочном закрытии генератора (например, клиент прервал загрузку)
+            del pitch_tensor, pitchf_tensor, sid
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
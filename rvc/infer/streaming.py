@@ -0,0 +1,265 @@
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import torch
+from scipy import signal
+
+from rvc.infer.pipeline import ah, bh
+from rvc.lib.predictors.f0 import predictor_pool
+
+
+# Потоковый преобразователь голоса поверх VC.vc
+class StreamingVC:
+    def __init__(
+        self,
+        hubert_model,
+        net_g,
+        vc,
+        version,
+        use_f0,
+        block_size=4800,
+        context_size=16000,
+        crossfade_size=1600,
+        lookahead_size=1600,
+        sid=0,
+        pitch=0,
+        f0_min=50,
+        f0_max=1100,
+        f0_method="rmvpe",
+        index=None,
+        big_npy=None,
+        index_rate=0,
+        protect=0.5,
+        autotune=False,
+        autotune_strength=1.0,
+        autotune_scale="chromatic",
+        autotune_key="C",
+        trim_latency=False,
+    ):
+        """
+        Инициализация потокового преобразователя.
+
+        Все размеры задаются в отсчетах 16 кГц и должны быть кратны 160 (один кадр F0).
+        На каждом шаге модели обрабатывают окно context + crossfade + block + lookahead,
+        поэтому стоимость шага не зависит от общей длины потока.
+        Задержка выхода относительно входа (latency_size) равна lookahead_size + crossfade_size:
+        на столько отсчетов результат сдвинут относительно входа, и именно их отбрасывает trim_latency.
+        В реальном времени к ней добавляется ожидание заполнения блока (до block_size отсчетов),
+        которое зависит от того, как поступает вход, и в latency не входит.
+        """
+        for name, size in (
+            ("block_size", block_size),
+            ("context_size", context_size),
+            ("crossfade_size", crossfade_size),
+            ("lookahead_size", lookahead_size),
+        ):
+            if size % vc.window != 0:
+                raise ValueError(f"{name} должен быть кратен {vc.window}, получено {size}")
+        if block_size <= 0:
+            raise ValueError("block_size должен быть больше нуля")
+        if crossfade_size > block_size:
+            raise ValueError("crossfade_size не может превышать block_size")
+
+        self.hubert_model = hubert_model
+        self.net_g = net_g
+        self.vc = vc
+        self.version = version
+        self.use_f0 = use_f0
+        self.block_size = block_size
+        self.context_size = context_size
+        self.crossfade_size = crossfade_size
+        self.lookahead_size = lookahead_size
+        self.latency_size = lookahead_size + crossfade_size
+        self.pitch = pitch
+        self.f0_min = f0_min
+        self.f0_max = f0_max
+        self.f0_method = f0_method
+        self.index = index
+        self.big_npy = big_npy
+        self.index_rate = index_rate
+        self.protect = protect
+        self.autotune = autotune
+        self.autotune_strength = autotune_strength
+        self.autotune_scale = autotune_scale
+        self.autotune_key = autotune_key
+        self.trim_latency = trim_latency
+        self.sid = torch.tensor(sid, device=vc.device).unsqueeze(0).long()
+
+        # Для RMVPE тон извлекается инкрементально: на каждом шаге считаются только новые кадры
+        self.f0_stream = None
+        if use_f0 and f0_method in ("rmvpe", "rmvpe+"):
+            self.f0_stream = predictor_pool.get(f0_method, vc.device, vc.dtype).stream(
+                f0_method, lookahead_frames=min(8, lookahead_size // vc.window)
+            )
+
+        # Коэффициент пересчета отсчетов 16 кГц в отсчеты выходной частоты
+        self.upp = vc.tgt_sr // 100
+        self.block_tgt = self._to_tgt(block_size)
+        self.crossfade_tgt = self._to_tgt(crossfade_size)
+
+        fade = np.sin(0.5 * np.pi * np.linspace(0, 1, self.crossfade_tgt, endpoint=False)) ** 2
+        self.fade_in = fade.astype(np.float32)
+        self.fade_out = 1 - self.fade_in
+
+        self.reset()
+
+    def _to_tgt(self, size):
+        return size // self.vc.window * self.upp
+
+    @property
+    def latency(self):
+        """
+        Задержка выхода относительно входа в секундах: lookahead_size + crossfade_size
+        (без ожидания заполнения блока и времени вычислений).
+        """
+        return self.latency_size / self.vc.sample_rate
+
+    def reset(self):
+        """
+        Сбрасывает состояние потока.
+        """
+        self.buffer = np.zeros(self.context_size + self.crossfade_size + self.block_size + self.lookahead_size, dtype=np.float32)
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.prev_tail = np.zeros(self.crossfade_tgt, dtype=np.float32)
+        self.samples_in = 0
+        self.samples_out = 0
+        self.samples_processed = 0
+        self.f0_history = np.zeros(0)
+        self.f0_frames = 0
+        if self.f0_stream is not None:
+            self.f0_stream.reset()
+        # Состояние фильтра высоких частот для входа RMVPE, переносится между блоками
+        self.f0_zi = np.zeros(max(len(ah), len(bh)) - 1)
+        self.skip = self._to_tgt(self.latency_size) if self.trim_latency else 0
+
+    def push(self, block: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Добавляет блок аудио 16 кГц и возвращает преобразованное аудио,
+        если накопился хотя бы один полный блок, иначе None.
+        """
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim == 2:
+            block = block.mean(-1)
+        self.samples_in += block.shape[0]
+        self.pending = np.concatenate([self.pending, block])
+
+        outputs = []
+        while self.pending.shape[0] >= self.block_size:
+            outputs.append(self._process(self.pending[: self.block_size]))
+            self.pending = self.pending[self.block_size :]
+
+        return self._emit(outputs)
+
+    def flush(self) -> Optional[np.ndarray]:
+        """
+        Досчитывает оставшийся вход (включая lookahead и хвост кроссфейда) и завершает поток.
+        """
+        expected = self._to_tgt(self.samples_in) + (0 if self.trim_latency else self._to_tgt(self.latency_size))
+        outputs = []
+        while self.samples_out + sum(o.shape[0] for o in outputs) < expected + self.skip:
+            block = np.zeros(self.block_size, dtype=np.float32)
+            block[: self.pending.shape[0]] = self.pending[: self.block_size]
+            self.pending = self.pending[self.block_size :]
+            outputs.append(self._process(block))
+
+        out = self._emit(outputs)
+        if out is not None and self.samples_out > expected:
+            out = out[: out.shape[0] - (self.samples_out - expected)]
+            self.samples_out = expected
+        self.reset()
+        return out
+
+    def stream(self, blocks: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+        """
+        Генератор: преобразует последовательность блоков и выдает результат по мере готовности.
+        """
+        for block in blocks:
+            out = self.push(block)
+            if out is not None:
+                yield out
+        out = self.flush()
+        if out is not None and out.shape[0] > 0:
+            yield out
+
+    def _emit(self, outputs):
+        if not outputs:
+            return None
+        out = np.concatenate(outputs)
+        if self.skip > 0:
+            skipped = min(self.skip, out.shape[0])
+            out = out[skipped:]
+            self.skip -= skipped
+        self.samples_out += out.shape[0]
+        return out
+
+    def _stream_f0(self, block, p_len):
+        # История F0 хранит последние известные кадры; кадры, еще не выданные RMVPE
+        # (lookahead), заполняются последним известным значением
+        f0_new = self.f0_stream.push(block)
+        self.f0_frames += f0_new.shape[0]
+        self.f0_history = np.concatenate([self.f0_history, f0_new])[-p_len:]
+
+        first_frame = (self.samples_processed - self.buffer.shape[0]) // self.vc.window
+        idx = first_frame + np.arange(p_len) - (self.f0_frames - self.f0_history.shape[0])
+        f0 = np.zeros(p_len)
+        if self.f0_history.shape[0] > 0:
+            known = (idx >= 0) & (idx < self.f0_history.shape[0])
+            f0[known] = self.f0_history[idx[known]]
+            f0[idx >= self.f0_history.shape[0]] = self.f0_history[-1]
+        return f0
+
+    def _process(self, block):
+        self.buffer = np.concatenate([self.buffer[self.block_size :], block])
+        self.samples_processed += self.block_size
+        audio = signal.filtfilt(bh, ah, self.buffer).astype(np.float32)
+        p_len = audio.shape[0] // self.vc.window
+
+        pitch = pitchf = None
+        if self.use_f0:
+            if self.f0_stream is not None:
+                # Тот же фильтр Баттерворта, что и для модели, но однопроходный с сохранением состояния:
+                # отфильтрованные отсчеты не зависят от положения границы блока
+                filtered, self.f0_zi = signal.lfilter(bh, ah, block, zi=self.f0_zi)
+                f0 = self._stream_f0(filtered.astype(np.float32), p_len)
+            else:
+                f0 = self.vc.compute_f0(audio, p_len, self.f0_min, self.f0_max, self.f0_method, use_cache=False)
+            pitch, pitchf = self.vc.process_f0(
+                f0,
+                self.pitch,
+                self.f0_min,
+                self.f0_max,
+                False,
+                155.0,
+                self.autotune,
+                self.autotune_strength,
+                self.autotune_scale,
+                self.autotune_key,
+            )
+            pitch = torch.tensor(pitch[:p_len], device=self.vc.device).unsqueeze(0).long()
+            pitchf = torch.tensor(pitchf[:p_len], device=self.vc.device).unsqueeze(0).float()
+
+        out = self.vc.vc(
+            self.hubert_model,
+            self.net_g,
+            self.sid,
+            audio,
+            pitch,
+            pitchf,
+            self.index,
+            self.big_npy,
+            self.index_rate,
+            self.version,
+            self.protect,
+            use_cache=False,
+        )
+
+        # Участок выхода, соответствующий новому блоку и хвосту кроссфейда
+        end = self._to_tgt(self.buffer.shape[0] - self.lookahead_size)
+        start = end - self.block_tgt - self.crossfade_tgt
+        segment = np.zeros(self.block_tgt + self.crossfade_tgt, dtype=np.float32)
+        available = out[start:end]
+        segment[: available.shape[0]] = available
+
+        segment[: self.crossfade_tgt] = segment[: self.crossfade_tgt] * self.fade_in + self.prev_tail * self.fade_out
+        self.prev_tail = segment[self.block_tgt :].copy()
+        return np.clip(segment[: self.block_tgt], -1.0, 1.0)
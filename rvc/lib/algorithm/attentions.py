@@ -132,16 +132,12 @@ class MultiHeadAttention(torch.nn.Module):
         return torch.matmul(x, y.unsqueeze(0).transpose(-2, -1))
 
     def _get_relative_embeddings(self, embeddings, length):
-        pad_length = max(length - (self.window_size + 1), 0)
-        start = max((self.window_size + 1) - length, 0)
-        end = start + 2 * length - 1
-
-        if pad_length > 0:
-            embeddings = torch.nn.functional.pad(
-                embeddings,
-                convert_pad_shape([[0, 0], [pad_length, pad_length], [0, 0]]),
-            )
-        return embeddings[:, start:end]
+        # Pad by the full length on both sides so the slice start is constant: no Python-level
+        # max() or branch on the length, which tracing (TorchScript/ONNX export) would freeze
+        # to the example input and break other segment lengths.
+        embeddings = torch.nn.functional.pad(embeddings, convert_pad_shape([[0, 0], [length, length], [0, 0]]))
+        start = self.window_size + 1
+        return embeddings[:, start : start + 2 * length - 1]
 
     def _relative_position_to_absolute_position(self, x):
         batch, heads, length, _ = x.size()
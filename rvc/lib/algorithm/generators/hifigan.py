@@ -184,8 +184,8 @@ class SineGenerator(torch.nn.Module):
 
     def forward(self, f0: torch.Tensor, upsampling_factor: int):
         with torch.no_grad():
-            # Expand `f0` to include waveform dimensions
-            f0 = f0.unsqueeze(-1)
+            # Expand `f0` to include waveform dimensions (phase is accumulated in fp32 even for fp16/bf16 models)
+            f0 = f0.unsqueeze(-1).float()
 
             # Generate sine waves
             sine_waves = self._generate_sine_wave(f0, upsampling_factor) * self.sine_amplitude
@@ -260,8 +260,8 @@ class SineGenerator(nn.Module):
 
             sine_waves = sine_waves * uv + noise
 
-        # merge with grad
-        return self.merge(sine_waves)
+        # merge with grad (sine phase is accumulated in fp32, the merge layer may run in reduced precision)
+        return self.merge(sine_waves.to(dtype=self.merge[0].weight.dtype))
 
 
 class RefineGANGenerator(nn.Module):
@@ -1,6 +1,7 @@
 from typing import Optional
 
 import torch
+from torch.nn.utils import parametrize
 
 from rvc.lib.algorithm.commons import rand_slice_segments, slice_segments
 from rvc.lib.algorithm.encoders import PosteriorEncoder, TextEncoder
@@ -156,13 +157,31 @@ class Synthesizer(torch.nn.Module):
         self.emb_g = torch.nn.Embedding(spk_embed_dim, gin_channels)
 
     def _remove_weight_norm_from(self, module):
-        for hook in module._forward_pre_hooks.values():
-            if getattr(hook, "__class__", None).__name__ == "WeightNorm":
-                torch.nn.utils.remove_weight_norm(module)
+        for submodule in module.modules():
+            # Parametrized weight norm (torch.nn.utils.parametrizations.weight_norm): fold into a plain weight
+            if parametrize.is_parametrized(submodule, "weight"):
+                parametrize.remove_parametrizations(submodule, "weight", leave_parametrized=True)
+            # Legacy hook-based weight norm
+            for hook in list(submodule._forward_pre_hooks.values()):
+                if getattr(hook, "__class__", None).__name__ == "WeightNorm":
+                    torch.nn.utils.remove_weight_norm(submodule)
 
     def remove_weight_norm(self):
-        for module in [self.dec, self.flow, self.enc_q]:
-            self._remove_weight_norm_from(module)
+        # enc_q is deleted for inference, dec is None for vocoders without pitch-less support
+        for module in [self.enc_p, self.dec, self.flow, getattr(self, "enc_q", None)]:
+            if module is not None:
+                self._remove_weight_norm_from(module)
+
+    def optimize_for_inference(self):
+        """
+        Prepares the model for inference: folds weight normalization into plain weights
+        (so the reparameterization is not recomputed on every forward pass of every conv)
+        and disables autograd tracking for all parameters.
+        """
+        self.remove_weight_norm()
+        self.eval()
+        self.requires_grad_(False)
+        return self
 
     def __prepare_scriptable__(self):
         self.remove_weight_norm()
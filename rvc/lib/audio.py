@@ -1,16 +1,181 @@
-import librosa
+import hashlib
+import os
+import shutil
+import subprocess
+import warnings
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
 import soundfile as sf
+from scipy import signal
+from scipy.io import wavfile
+
+from rvc.lib import disk_cache
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+# Форматы, которые libsndfile записывает напрямую: (контейнер, подтип) для soundfile.
+# WAV остается 32-битным float, как при прежней записи через scipy; FLAC и AIFF поддерживают только целые, поэтому PCM 24 бит
+SOUNDFILE_FORMATS = {
+    "wav": ("WAV", "FLOAT"),
+    "flac": ("FLAC", "PCM_24"),
+    "ogg": ("OGG", "VORBIS"),
+    "aiff": ("AIFF", "PCM_24"),
+}
+# Имена мультиплексоров ffmpeg для форматов, кодируемых через ffmpeg (у остальных совпадают с расширением)
+FFMPEG_MUXERS = {"m4a": "ipod"}
+# Многоканальные файлы декодируются и сводятся в моно блоками по столько кадров
+BLOCK_FRAMES = 1 << 20
+
+
+def _to_float32(data):
+    # Целочисленный PCM масштабируется так же, как это делает libsndfile
+    if data.dtype == np.uint8:
+        return (data.astype(np.float32) - 128) / 128
+    if np.issubdtype(data.dtype, np.integer):
+        return data.astype(np.float32) / np.float32(-np.iinfo(data.dtype).min)
+    return data.astype(np.float32, copy=False)
+
+
+def _read_wav_mmap(file):
+    # WAV (PCM/float) через memory-map; для форматов, которые scipy не может отобразить (например, 24 бит), возвращает None
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", wavfile.WavFileWarning)
+            sr, data = wavfile.read(file, mmap=True)
+    except (ValueError, TypeError):
+        return None
+
+    if data.ndim > 1:
+        # Сведение в моно прямо из отображения, чтобы многоканальные данные не копировались целиком
+        mono = np.empty(data.shape[0], dtype=np.float32)
+        for start in range(0, data.shape[0], BLOCK_FRAMES):
+            mono[start : start + BLOCK_FRAMES] = _to_float32(data[start : start + BLOCK_FRAMES]).mean(axis=1)
+        return mono, sr
+    return _to_float32(data), sr
+
+
+def _read_soundfile(file):
+    with sf.SoundFile(file) as f:
+        sr = f.samplerate
+        if f.channels == 1:
+            return f.read(dtype="float32"), sr
+        blocks = [block.mean(axis=1) for block in f.blocks(BLOCK_FRAMES, dtype="float32")]
+    return (np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)), sr
+
+
+@lru_cache(maxsize=16)
+def _polyphase_filter(up, down):
+    # Тот же антиалиасинговый фильтр, что и в scipy.signal.resample_poly, рассчитывается один раз для каждого отношения частот
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    return signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0))
 
 
-def load_audio(file, sample_rate):
+def resample(audio, orig_sr, target_sr):
+    if orig_sr == target_sr:
+        return audio
+    if soxr is not None:
+        # soxr "HQ" используется в librosa.resample по умолчанию, поэтому результат совпадает с прежним загрузчиком
+        return soxr.resample(audio, orig_sr, target_sr, quality="HQ").astype(np.float32, copy=False)
+
+    g = gcd(orig_sr, target_sr)
+    up, down = target_sr // g, orig_sr // g
+    return signal.resample_poly(audio, up, down, window=_polyphase_filter(up, down)).astype(np.float32, copy=False)
+
+
+def _cache_path(file, sample_rate, cache_dir):
+    stat = os.stat(file)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{os.path.abspath(file)}|{stat.st_size}|{stat.st_mtime_ns}|{sample_rate}".encode())
+    return os.path.join(cache_dir, f"{digest.hexdigest()}.npy")
+
+
+def load_audio(file, sample_rate, cache_dir=None, cache_max_mb=1024):
+    """
+    Загружает аудиофайл в моно float32 с частотой sample_rate.
+
+    WAV по возможности открывается через memory-map, остальные файлы декодируются блоками
+    со сведением в моно на лету. Если задан cache_dir, декодированные и передискретизированные
+    сжатые файлы (все, кроме WAV) сохраняются туда в .npy с ключом по пути, размеру, mtime
+    и частоте, поэтому повторная загрузка обходится без декодирования. Размер кэша ограничен
+    cache_max_mb, при превышении удаляются самые давно использованные файлы.
+    """
     try:
         file = file.strip(" ").strip('"').strip("\n").strip('"').strip(" ")
-        audio, sr = sf.read(file)
-        if len(audio.shape) > 1:
-            audio = librosa.to_mono(audio.T)
-        if sr != sample_rate:
-            audio = librosa.resample(audio, orig_sr=sr, target_sr=sample_rate)
+        cache_path = None
+        if cache_dir and os.path.splitext(file)[1].lower() != ".wav":
+            cache_path = _cache_path(file, sample_rate, cache_dir)
+            if os.path.exists(cache_path):
+                try:
+                    audio = np.load(cache_path)
+                    disk_cache.touch(cache_path)
+                    return audio
+                except (OSError, ValueError):
+                    pass
+
+        loaded = _read_wav_mmap(file) if os.path.splitext(file)[1].lower() == ".wav" else None
+        audio, sr = loaded if loaded is not None else _read_soundfile(file)
+        audio = np.ascontiguousarray(resample(audio, sr, sample_rate)).flatten()
+
+        if cache_path is not None:
+            # Запись через временный файл, чтобы параллельные процессы не прочитали неполный файл
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, audio)
+            os.replace(tmp_path, cache_path)
+            disk_cache.trim(cache_dir, int(cache_max_mb * 1024 * 1024))
     except Exception as error:
         raise RuntimeError(f"An error occurred loading the audio: {error}") from error
 
-    return audio.flatten()
+    return audio
+
+
+def write_audio(path, audio, sample_rate, output_format=None):
+    """
+    Записывает float-буфер (моно или многоканальный) сразу в выходной формат.
+
+    WAV (32-битный float), FLAC и AIFF (PCM 24 бит) и OGG (Vorbis) кодируются
+    в текущем процессе через soundfile.
+    Остальные форматы кодирует один процесс ffmpeg, получающий сырой PCM float32
+    через stdin, поэтому промежуточный файл не создается.
+    """
+    output_format = (output_format or os.path.splitext(path)[1][1:]).lower()
+    audio = np.asarray(audio, dtype=np.float32)
+
+    if output_format in SOUNDFILE_FORMATS:
+        container, subtype = SOUNDFILE_FORMATS[output_format]
+        sf.write(path, audio, sample_rate, format=container, subtype=subtype)
+        return path
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError(f"ffmpeg is required to write '{output_format}' audio but was not found in PATH")
+
+    channels = 1 if audio.ndim == 1 else audio.shape[1]
+    command = [
+        ffmpeg,
+        "-y",
+        "-loglevel",
+        "error",
+        "-f",
+        "f32le",
+        "-ar",
+        str(sample_rate),
+        "-ac",
+        str(channels),
+        "-i",
+        "pipe:0",
+        "-f",
+        FFMPEG_MUXERS.get(output_format, output_format),
+        path,
+    ]
+    result = subprocess.run(command, input=audio.astype("<f4").tobytes(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to write '{path}': {result.stderr.decode(errors='replace').strip()}")
+    return path
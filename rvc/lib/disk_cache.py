@@ -0,0 +1,36 @@
+import os
+
+
+# Время изменения файла служит отметкой последнего использования для вытеснения
+def touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+# Удаляет самые давно использованные файлы .npy, пока их суммарный размер превышает max_bytes
+def trim(cache_dir, max_bytes):
+    files = []
+    try:
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".npy"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            # Файл мог удалить другой процесс
+            pass
+        total -= size
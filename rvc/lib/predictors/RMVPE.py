@@ -305,7 +305,7 @@ class MelSpectrogram(torch.nn.Module):
 
 
 class RMVPEF0Predictor:
-    def __init__(self, model_path, device=None):
+    def __init__(self, model_path, device=None, dtype=torch.float32):
         self.resample_kernel = {}
         model = E2E(4, 1, (2, 2))
         ckpt = torch.load(model_path, map_location="cpu", weights_only=True)
@@ -314,10 +314,13 @@ class RMVPEF0Predictor:
         self.model = model
         self.resample_kernel = {}
         self.device = device
+        self.dtype = dtype
+        # The mel spectrogram (STFT) is always computed in fp32; only the network runs in reduced precision
         self.mel_extractor = MelSpectrogram(N_MELS, 16000, 1024, 160, None, 30, 8000).to(device)
-        self.model = self.model.to(device)
+        self.model = self.model.to(device, dtype)
         cents_mapping = 20 * np.arange(N_CLASS) + 1997.3794084376191
         self.cents_mapping = np.pad(cents_mapping, (4, 4))
+        self.cents_mapping_torch = None
 
     def mel2hidden(self, input_mel, chunk_size=32000):
         with torch.no_grad():
@@ -329,25 +332,31 @@ class RMVPEF0Predictor:
                 end = min(start + chunk_size, pad_frames)
                 mel_chunk = padded_mel[..., start:end]
                 assert mel_chunk.shape[-1] % 32 == 0, "chunk_size must be divisible by 32"
-                out_chunk = self.model(mel_chunk)
+                out_chunk = self.model(mel_chunk.to(self.dtype))
                 output_chunks.append(out_chunk)
-            hidden = torch.cat(output_chunks, dim=1)
+            hidden = torch.cat(output_chunks, dim=1).float()
         return hidden[:, :n_frames]
 
     def decode(self, hidden, thred=0.03):
         cents_pred = self.to_local_average_cents(hidden, thred=thred)
         f0 = 10 * (2 ** (cents_pred / 1200))
         f0[f0 == 10] = 0
+        if torch.is_tensor(f0):
+            f0 = f0.cpu().numpy()
         return f0
 
+    def hidden_for_decode(self, hidden):
+        # On accelerators the peak search runs on the device and only F0 is copied back
+        hidden = hidden.squeeze(0)
+        return hidden if hidden.device.type != "cpu" else hidden.cpu().numpy()
+
     def infer_from_audio(self, audio, thred=0.03):
         audio = torch.from_numpy(audio).float().to(self.device).unsqueeze(0)
         extracted_mel = self.mel_extractor(audio, center=True)
         del audio
         with torch.no_grad():
             torch.cuda.empty_cache()
-        hidden = self.mel2hidden(extracted_mel)
-        hidden = hidden.squeeze(0).cpu().numpy()
+        hidden = self.hidden_for_decode(self.mel2hidden(extracted_mel))
         f0 = self.decode(hidden, thred=thred)
         return f0
 
@@ -357,29 +366,125 @@ class RMVPEF0Predictor:
         del audio
         with torch.no_grad():
             torch.cuda.empty_cache()
-        hidden = self.mel2hidden(extracted_mel)
-        hidden = hidden.squeeze(0).cpu().numpy()
+        hidden = self.hidden_for_decode(self.mel2hidden(extracted_mel))
         f0 = self.decode(hidden, thred=thred)
         f0[(f0 < f0_min) | (f0 > f0_max)] = 0
         smoothed_f0 = medfilt(f0, kernel_size=window_size)
         return smoothed_f0
 
     def to_local_average_cents(self, salience, thred=0.05):
+        if torch.is_tensor(salience):
+            return self.to_local_average_cents_torch(salience, thred=thred)
+
         center = np.argmax(salience, axis=1)
         salience = np.pad(salience, ((0, 0), (4, 4)))
-        center += 4
-        todo_salience = []
-        todo_cents_mapping = []
-        starts = center - 4
-        ends = center + 5
-        for idx in range(salience.shape[0]):
-            todo_salience.append(salience[:, starts[idx] : ends[idx]][idx])
-            todo_cents_mapping.append(self.cents_mapping[starts[idx] : ends[idx]])
-        todo_salience = np.array(todo_salience)
-        todo_cents_mapping = np.array(todo_cents_mapping)
+        # Indices of the 9 bins around the peak in the padded salience
+        window = center[:, None] + np.arange(9)
+        todo_salience = np.take_along_axis(salience, window, axis=1)
+        todo_cents_mapping = self.cents_mapping[window]
         product_sum = np.sum(todo_salience * todo_cents_mapping, 1)
         weight_sum = np.sum(todo_salience, 1)
         devided = product_sum / weight_sum
         maxx = np.max(salience, axis=1)
         devided[maxx <= thred] = 0
         return devided
+
+    def to_local_average_cents_torch(self, salience, thred=0.05):
+        if self.cents_mapping_torch is None or self.cents_mapping_torch.device != salience.device:
+            self.cents_mapping_torch = torch.from_numpy(self.cents_mapping).to(salience.device, torch.float32)
+
+        center = torch.argmax(salience, dim=1)
+        salience = torch.nn.functional.pad(salience, (4, 4))
+        window = center[:, None] + torch.arange(9, device=salience.device)
+        todo_salience = torch.gather(salience, 1, window)
+        todo_cents_mapping = self.cents_mapping_torch[window]
+        devided = (todo_salience * todo_cents_mapping).sum(1) / todo_salience.sum(1)
+        maxx = salience.max(dim=1).values
+        devided[maxx <= thred] = 0
+        return devided
+
+
+class RMVPEStream:
+    """
+    Incremental F0 extraction on top of RMVPEF0Predictor.
+
+    Mel frames are computed only for newly pushed samples, a bounded window of recent mel
+    frames is kept as context, and mel2hidden runs on that window only, so the cost per
+    block does not grow with the total stream length. Because the BiGRU is bidirectional,
+    the last `lookahead_frames` frames are held back until they have right context.
+    """
+
+    def __init__(self, predictor, context_frames=128, lookahead_frames=8, thred=0.03):
+        self.predictor = predictor
+        self.context_frames = context_frames
+        self.lookahead_frames = lookahead_frames
+        self.thred = thred
+        self.n_fft = predictor.mel_extractor.n_fft
+        self.hop_length = predictor.mel_extractor.hop_length
+        self.silence = float(np.log(predictor.mel_extractor.clamp))
+        self.reset()
+
+    def reset(self):
+        # torch.stft(center=True) in infer_from_audio pads both ends by reflection; the left
+        # half-window is added once the first n_fft // 2 + 1 samples have arrived
+        self.audio = np.zeros(0, dtype=np.float32)
+        self.started = False
+        self.mel = None
+        self.pending = 0
+
+    def push(self, audio):
+        """
+        Feeds new 16 kHz samples and returns F0 for the frames that became final.
+        """
+        self._extract_mel(np.asarray(audio, dtype=np.float32))
+        return self._decode(self.pending - self.lookahead_frames)
+
+    def flush(self):
+        """
+        Returns F0 for all remaining frames, including the held back lookahead.
+        """
+        half = self.n_fft // 2
+        if not self.started and self.audio.shape[0] > 1:
+            # Stream shorter than half a window: numpy repeats the reflection as needed
+            self.audio = np.pad(self.audio, (half, 0), mode="reflect")
+            self.started = True
+        if self.started:
+            self._extract_mel(np.pad(self.audio, (0, half), mode="reflect")[self.audio.shape[0] :])
+        f0 = self._decode(self.pending)
+        self.reset()
+        return f0
+
+    def _extract_mel(self, audio):
+        self.audio = np.concatenate([self.audio, audio])
+        if not self.started:
+            half = self.n_fft // 2
+            if self.audio.shape[0] <= half:
+                return
+            self.audio = np.concatenate([self.audio[half:0:-1], self.audio])
+            self.started = True
+        if self.audio.shape[0] < self.n_fft:
+            return
+        n_new = (self.audio.shape[0] - self.n_fft) // self.hop_length + 1
+        chunk = torch.from_numpy(self.audio[: (n_new - 1) * self.hop_length + self.n_fft]).to(self.predictor.device).unsqueeze(0)
+        with torch.no_grad():
+            mel = self.predictor.mel_extractor(chunk, center=False)
+        self.audio = self.audio[n_new * self.hop_length :]
+        self.mel = mel if self.mel is None else torch.cat([self.mel, mel], dim=-1)
+        self.pending += n_new
+
+    def _decode(self, n_emit):
+        if n_emit <= 0 or self.mel is None:
+            return np.zeros(0)
+
+        window = self.mel
+        if window.shape[-1] < 32:
+            # mel2hidden pads by reflection, which needs at least one full 32-frame chunk
+            window = torch.nn.functional.pad(window, (32 - window.shape[-1], 0), value=self.silence)
+        hidden = self.predictor.mel2hidden(window).squeeze(0)
+
+        start = hidden.shape[0] - self.pending
+        f0 = self.predictor.decode(hidden[start : start + n_emit].cpu().numpy(), thred=self.thred)
+
+        self.pending -= n_emit
+        self.mel = self.mel[..., -(self.context_frames + self.pending) :]
+        return f0
@@ -1,11 +1,12 @@
 import os
+import threading
 
 import numpy as np
 import torch
 import torchcrepe
 from torchfcpe import spawn_bundled_infer_model
 
-from rvc.lib.predictors.RMVPE import RMVPEF0Predictor
+from rvc.lib.predictors.RMVPE import RMVPEF0Predictor, RMVPEStream
 
 
 def median_interp_pitch(f0):
@@ -17,6 +18,20 @@ def calc_pitch_shift(f0, target_f0=155.0, limit_f0=12):
     return max(-limit_f0, min(limit_f0, int(np.round(12 * np.log2(target_f0 / median_interp_pitch(f0))))))
 
 
+NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+
+# Интервалы (в полутонах от тоники) нот, допустимых в каждом ладу
+SCALES = {
+    "chromatic": (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11),
+    "major": (0, 2, 4, 5, 7, 9, 11),
+    "minor": (0, 2, 3, 5, 7, 8, 10),
+    "harmonic_minor": (0, 2, 3, 5, 7, 8, 11),
+    "pentatonic_major": (0, 2, 4, 7, 9),
+    "pentatonic_minor": (0, 3, 5, 7, 10),
+    "blues": (0, 3, 5, 6, 7, 10),
+}
+
+
 class AutoTune:
     def __init__(self):
         self.note_dict = [
@@ -76,19 +91,40 @@ class AutoTune:
             1046.50,  # C6
         ]
 
-    def autotune_f0(self, f0, f0_autotune_strength):
-        autotuned_f0 = np.zeros_like(f0)
-        for i, freq in enumerate(f0):
-            closest_note = min(self.note_dict, key=lambda x: abs(x - freq))
-            autotuned_f0[i] = freq + (closest_note - freq) * f0_autotune_strength
-        return autotuned_f0
+        self.note_table = np.array(self.note_dict)
+        # note_dict starts at G1, so the pitch class of note i is (7 + i) % 12
+        self.note_classes = (NOTE_NAMES.index("G") + np.arange(len(self.note_dict))) % 12
+        self.scale_tables = {}
+
+    def get_notes(self, scale="chromatic", key="C"):
+        if (scale, key) not in self.scale_tables:
+            if scale not in SCALES:
+                raise ValueError(f"Unknown scale '{scale}'. Available: {', '.join(SCALES)}")
+            if key not in NOTE_NAMES:
+                raise ValueError(f"Unknown key '{key}'. Available: {', '.join(NOTE_NAMES)}")
+            allowed = [(NOTE_NAMES.index(key) + interval) % 12 for interval in SCALES[scale]]
+            self.scale_tables[(scale, key)] = self.note_table[np.isin(self.note_classes, allowed)]
+        return self.scale_tables[(scale, key)]
+
+    def autotune_f0(self, f0, f0_autotune_strength, scale="chromatic", key="C"):
+        f0 = np.asarray(f0)
+        notes = self.get_notes(scale, key)
+
+        # Ближайшая нота двоичным поиском по отсортированной таблице; при равенстве выбирается нижняя
+        idx = np.clip(np.searchsorted(notes, f0), 1, len(notes) - 1)
+        lower, upper = notes[idx - 1], notes[idx]
+        closest_note = np.where(f0 - lower <= upper - f0, lower, upper)
+
+        autotuned_f0 = f0 + (closest_note - f0) * f0_autotune_strength
+        # Невокализованные кадры (0 Гц) остаются невокализованными
+        return np.where(f0 > 0, autotuned_f0, f0).astype(f0.dtype, copy=False)
 
 
 class RMVPE:
-    def __init__(self, device, sample_rate=16000):
+    def __init__(self, device, sample_rate=16000, dtype=torch.float32):
         self.device = device
         self.sample_rate = sample_rate
-        self.model = RMVPEF0Predictor(os.path.join("rvc", "models", "predictors", "rmvpe.pt"), device=self.device)
+        self.model = RMVPEF0Predictor(os.path.join("rvc", "models", "predictors", "rmvpe.pt"), device=self.device, dtype=dtype)
 
     def get_f0(self, audio, type_rmvpe="rmvpe"):
         if type_rmvpe == "rmvpe":
@@ -97,6 +133,10 @@ class RMVPE:
             f0 = self.model.infer_from_audio_modified(audio, thred=0.02)
         return f0
 
+    def stream(self, type_rmvpe="rmvpe", context_frames=128, lookahead_frames=8):
+        thred = 0.02 if type_rmvpe == "rmvpe+" else 0.03
+        return RMVPEStream(self.model, context_frames, lookahead_frames, thred)
+
 
 class CREPE:
     def __init__(self, device, sample_rate=16000, hop_size=160):
@@ -157,3 +197,99 @@ class FCPE:
         )
 
         return f0
+
+
+class F0PredictorPool:
+    """
+    Общий для процесса пул предикторов F0 с ключом (method, device, dtype).
+
+    Предиктор загружается при первом обращении и затем переиспользуется, поэтому веса RMVPE
+    и модель FCPE не загружаются заново при каждой конвертации. "rmvpe"/"rmvpe+" и "crepe"/"crepe-tiny"
+    используют один экземпляр, так как отличаются только декодированием. Пониженная точность
+    применяется только к RMVPE; CREPE и FCPE управляют своими моделями сами и всегда работают в fp32.
+    """
+
+    def __init__(self, sample_rate=16000, hop_size=160):
+        self.sample_rate = sample_rate
+        self.hop_size = hop_size
+        self.predictors = {}
+        self.lock = threading.Lock()
+        # Ключи, загружаемые в данный момент, и события окончания их загрузки
+        self.loading = {}
+
+    @staticmethod
+    def kind(method):
+        if method in ("rmvpe", "rmvpe+"):
+            return "rmvpe"
+        if method in ("crepe", "crepe-tiny"):
+            return "crepe"
+        if method == "fcpe":
+            return "fcpe"
+        raise ValueError(f"Unknown F0 method '{method}'")
+
+    def get(self, method, device, dtype=torch.float32):
+        kind = self.kind(method)
+        if kind != "rmvpe":
+            dtype = torch.float32
+        key = (kind, str(device), str(dtype))
+        while True:
+            with self.lock:
+                predictor = self.predictors.get(key)
+                if predictor is not None:
+                    return predictor
+                loading = self.loading.get(key)
+                if loading is None:
+                    loading = self.loading[key] = threading.Event()
+                    break
+            # Если загрузка в другом потоке завершилась ошибкой, записи не будет и этот поток загрузит предиктор сам
+            loading.wait()
+
+        # Веса загружаются вне блокировки, чтобы не задерживать обращения к уже загруженным предикторам
+        try:
+            predictor = self._create(kind, device, dtype)
+            with self.lock:
+                self.predictors[key] = predictor
+            return predictor
+        finally:
+            with self.lock:
+                del self.loading[key]
+            loading.set()
+
+    def _create(self, kind, device, dtype=torch.float32):
+        if kind == "rmvpe":
+            return RMVPE(device=device, sample_rate=self.sample_rate, dtype=dtype)
+        if kind == "crepe":
+            return CREPE(device=device, sample_rate=self.sample_rate, hop_size=self.hop_size)
+        return FCPE(device=device, sample_rate=self.sample_rate, hop_size=self.hop_size)
+
+    def warmup(self, method, device, dtype=torch.float32, seconds=1.0):
+        """
+        Загружает предиктор и один раз прогоняет его на тишине, чтобы первый настоящий вызов
+        не замедлялся отложенной инициализацией (ядра CUDA, загрузка модели torchcrepe).
+        dtype должен совпадать с тем, с которым предиктор потом запрашивается через get
+        (для VC.compute_f0 — config.dtype), иначе прогревается другой экземпляр.
+        """
+        model = self.get(method, device, dtype)
+        audio = np.zeros(int(self.sample_rate * seconds), dtype=np.float32)
+        if method in ("crepe", "crepe-tiny"):
+            model.get_f0(audio, model="tiny" if method == "crepe-tiny" else "full")
+        elif method == "fcpe":
+            model.get_f0(audio)
+        else:
+            model.get_f0(audio, method)
+        return model
+
+    def unload(self, method=None, device=None):
+        """
+        Удаляет предикторы из пула; method и device ограничивают, какие именно.
+        """
+        kind = self.kind(method) if method is not None else None
+        with self.lock:
+            for key in list(self.predictors):
+                if (kind is None or key[0] == kind) and (device is None or key[1] == str(device)):
+                    del self.predictors[key]
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+predictor_pool = F0PredictorPool()
@@ -1,5 +1,7 @@
+import json
 import os
 import sys
+import time
 from multiprocessing import cpu_count
 
 import faiss
@@ -8,6 +10,144 @@ from sklearn.cluster import MiniBatchKMeans
 
 exp_dir = str(sys.argv[1])
 index_algorithm = str(sys.argv[2])
+# Тип индекса: IVF-Flat (по умолчанию), IVF-PQ, OPQ-IVF-PQ или HNSW
+index_type = str(sys.argv[3]) if len(sys.argv) > 3 else "IVF-Flat"
+# Минимальная полнота recall@8, по которой выбираются nprobe/efSearch
+target_recall = float(sys.argv[4]) if len(sys.argv) > 4 else 0.9
+# Сжатие больших наборов (> 2e5 векторов) кластеризацией: Auto/FaissKMeans — faiss.Kmeans, KMeans — sklearn
+kmeans_clusters = int(sys.argv[5]) if len(sys.argv) > 5 else 10000
+kmeans_iterations = int(sys.argv[6]) if len(sys.argv) > 6 else 20
+# Не больше стольких точек на кластер в обучающей выборке faiss.Kmeans (0 — без подвыборки);
+# 64 точки × 10000 кластеров × 768 измерений — около 2 ГБ
+kmeans_max_points = int(sys.argv[7]) if len(sys.argv) > 7 else 64
+# Бюджет времени поиска в мс на 1000 запросов (около 20 с аудио): значения nprobe/efSearch,
+# превышающие его на этой машине, не выбираются даже ради нужной полноты
+search_budget_ms = float(sys.argv[8]) if len(sys.argv) > 8 else 50.0
+
+INDEX_TYPES = ("IVF-Flat", "IVF-PQ", "OPQ-IVF-PQ", "HNSW")
+SEARCH_K = 8
+# Число подквантователей PQ (по 8 бит): 64 байта на вектор вместо 3072 у Flat для 768 измерений
+PQ_M = 64
+# Размер случайной выборки для обучения квантователей индекса (не меньше 64 точек на кластер IVF)
+TRAIN_SAMPLE_SIZE = 100000
+# Число проходов sklearn MiniBatchKMeans по потоку признаков
+KMEANS_EPOCHS = 3
+# Верхняя граница автоматически подбираемых параметров поиска (по умолчанию в FAISS nprobe=1, efSearch=16)
+MAX_SEARCH_PARAMS = {"nprobe": 32, "efSearch": 128}
+
+
+# Строка index_factory и перебираемый параметр поиска для выбранного типа индекса
+def index_factory_string(index_type, n_ivf, dim):
+    if index_type == "IVF-Flat":
+        return f"IVF{n_ivf},Flat", "nprobe"
+    if index_type == "IVF-PQ":
+        return f"IVF{n_ivf},PQ{PQ_M}x8", "nprobe"
+    if index_type == "OPQ-IVF-PQ":
+        return f"OPQ{PQ_M}_{dim},IVF{n_ivf},PQ{PQ_M}x8", "nprobe"
+    if index_type == "HNSW":
+        return "HNSW32", "efSearch"
+    raise ValueError(f"Неизвестный тип индекса '{index_type}'. Доступные: {', '.join(INDEX_TYPES)}")
+
+
+# Выдает (номер первой строки, пакет float32) из списка массивов (обычно memory-map файлов признаков).
+# Короткие файлы объединяются, поэтому пакеты содержат не меньше batch_size строк (кроме последнего)
+def iter_batches(arrays, batch_size):
+    offset, pending, pending_rows = 0, [], 0
+    for array in arrays:
+        for i in range(0, array.shape[0], batch_size):
+            pending.append(array[i : i + batch_size])
+            pending_rows += pending[-1].shape[0]
+            if pending_rows >= batch_size:
+                yield offset, np.concatenate(pending).astype(np.float32, copy=False)
+                offset += pending_rows
+                pending, pending_rows = [], 0
+    if pending:
+        yield offset, np.concatenate(pending).astype(np.float32, copy=False)
+
+
+# Случайная выборка строк без повторов; в память читаются только выбранные строки
+def sample_rows(arrays, count, rng):
+    offsets = np.cumsum([0] + [array.shape[0] for array in arrays])
+    rows = np.sort(rng.choice(offsets[-1], size=min(count, offsets[-1]), replace=False))
+    parts = []
+    for i, array in enumerate(arrays):
+        local = rows[(rows >= offsets[i]) & (rows < offsets[i + 1])] - offsets[i]
+        if local.shape[0] > 0:
+            parts.append(np.asarray(array[local], dtype=np.float32))
+    sample = np.concatenate(parts)
+    rng.shuffle(sample)
+    return sample
+
+
+# Точные k ближайших соседей полным перебором, по одному пакету базы за раз
+def exact_neighbors(queries, arrays, k, batch_size):
+    heap = faiss.ResultHeap(queries.shape[0], k)
+    for start, batch in iter_batches(arrays, batch_size):
+        distances, ix = faiss.knn(queries, batch, min(k, batch.shape[0]))
+        heap.add_result(distances, ix + start)
+    heap.finalize()
+    return heap.I
+
+
+# Кластеризация faiss.Kmeans (многопоточная) по случайной выборке не больше max_points точек на кластер
+def faiss_kmeans(features, n_clusters, iterations, max_points, rng):
+    faiss.omp_set_num_threads(cpu_count())
+    n_vectors = sum(phone.shape[0] for phone in features)
+    sample_size = n_vectors if max_points <= 0 else min(n_vectors, n_clusters * max_points)
+    sample = sample_rows(features, sample_size, rng)
+    kmeans = faiss.Kmeans(
+        sample.shape[1],
+        n_clusters,
+        niter=iterations,
+        max_points_per_centroid=max(max_points, sample.shape[0] // n_clusters + 1),
+        seed=int(rng.integers(2**31)),
+        verbose=True,
+    )
+    kmeans.train(sample)
+    return kmeans.centroids
+
+
+# Кластеризация sklearn MiniBatchKMeans: файлы подаются в partial_fit в случайном порядке, несколько проходов
+def sklearn_kmeans(features, n_clusters, rng):
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, compute_labels=False, init="random")
+    # Первый пакет должен содержать не меньше точек, чем кластеров (инициализация)
+    batch_size = max(256 * cpu_count(), n_clusters)
+    for epoch in range(KMEANS_EPOCHS):
+        shuffled = [features[j] for j in rng.permutation(len(features))]
+        for _, batch in iter_batches(shuffled, batch_size):
+            kmeans.partial_fit(batch)
+        print(f"KMeans: проход {epoch + 1}/{KMEANS_EPOCHS}")
+    return kmeans.cluster_centers_.astype(np.float32)
+
+
+# Перебирает значения параметра поиска и замеряет скорость и recall@8 относительно полного перебора
+def benchmark_search(index, param, values, queries, ground_truth):
+    params = faiss.ParameterSpace()
+    results = []
+    for value in values:
+        params.set_index_parameters(index, f"{param}={value}")
+        # Прогрев, затем замер пакетного поиска (так же, как в VC.vc)
+        index.search(queries[:16], SEARCH_K)
+        start = time.perf_counter()
+        _, ix = index.search(queries, SEARCH_K)
+        elapsed = time.perf_counter() - start
+        recall = np.mean([len(set(row) & set(gt)) / SEARCH_K for row, gt in zip(ix, ground_truth)])
+        results.append({param: value, "qps": queries.shape[0] / max(elapsed, 1e-9), "recall": float(recall)})
+    return results
+
+
+def choose_search_param(results, param, target_recall, budget_ms):
+    """
+    Выбирает значение параметра поиска: наименьшее с полнотой не ниже target_recall среди
+    значений не выше MAX_SEARCH_PARAMS[param], укладывающихся в бюджет budget_ms на 1000 запросов.
+    Если цель недостижима — значение с наибольшей полнотой среди допустимых;
+    если бюджет не выдерживает ни одно значение — самое быстрое.
+    """
+    allowed = [r for r in results if r[param] <= MAX_SEARCH_PARAMS[param] and 1e6 / r["qps"] <= budget_ms]
+    if not allowed:
+        return max(results, key=lambda r: r["qps"])
+    return next((r for r in allowed if r["recall"] >= target_recall), max(allowed, key=lambda r: r["recall"]))
+
 
 try:
     feature_dir = os.path.join(exp_dir, "data", "features")
@@ -19,45 +159,80 @@ try:
     if os.path.exists(index_filepath):
         pass
     else:
-        npys = []
-        listdir_res = sorted(os.listdir(feature_dir))
-
-        for name in listdir_res:
-            file_path = os.path.join(feature_dir, name)
-            phone = np.load(file_path)
-            npys.append(phone)
-
-        big_npy = np.concatenate(npys, axis=0)
-
-        big_npy_idx = np.arange(big_npy.shape[0])
-        np.random.shuffle(big_npy_idx)
-        big_npy = big_npy[big_npy_idx]
-
-        if big_npy.shape[0] > 2e5 and index_algorithm in ("Auto", "KMeans"):
-            big_npy = (
-                MiniBatchKMeans(
-                    n_clusters=10000,
-                    verbose=True,
-                    batch_size=256 * cpu_count(),
-                    compute_labels=False,
-                    init="random",
-                )
-                .fit(big_npy)
-                .cluster_centers_
-            )
-
-        n_ivf = min(int(16 * np.sqrt(big_npy.shape[0])), big_npy.shape[0] // 39)
-
-        index_added = faiss.index_factory(768, f"IVF{n_ivf},Flat")
-        index_ivf_added = faiss.extract_index_ivf(index_added)
-        index_ivf_added.nprobe = 1
-        index_added.train(big_npy)
+        # Файлы признаков открываются через memory-map: в памяти находятся только текущий пакет и выборки
+        features = []
+        for name in sorted(os.listdir(feature_dir)):
+            phone = np.load(os.path.join(feature_dir, name), mmap_mode="r")
+            if phone.ndim == 2 and phone.shape[0] > 0:
+                features.append(phone)
 
+        rng = np.random.default_rng()
+        n_vectors = sum(phone.shape[0] for phone in features)
+        dim = features[0].shape[1]
         batch_size_add = 8192
-        for i in range(0, big_npy.shape[0], batch_size_add):
-            index_added.add(big_npy[i : i + batch_size_add])
+        # Запросы для замера — случайные кадры исходных признаков (до кластеризации KMeans)
+        queries = sample_rows(features, 1000, rng)
+
+        if n_vectors > 2e5 and index_algorithm in ("Auto", "FaissKMeans", "KMeans"):
+            start = time.perf_counter()
+            if index_algorithm == "KMeans":
+                centroids = sklearn_kmeans(features, kmeans_clusters, rng)
+            else:
+                centroids = faiss_kmeans(features, kmeans_clusters, kmeans_iterations, kmeans_max_points, rng)
+            print(f"KMeans ({index_algorithm}): {n_vectors} -> {centroids.shape[0]} векторов за {time.perf_counter() - start:.1f} с")
+            features = [centroids]
+            n_vectors = centroids.shape[0]
+
+        n_ivf = min(int(16 * np.sqrt(n_vectors)), n_vectors // 39)
+        factory, search_param = index_factory_string(index_type, n_ivf, dim)
+
+        index_added = faiss.index_factory(dim, factory)
+        if index_type == "HNSW":
+            index_added.hnsw.efConstruction = 80
+        start = time.perf_counter()
+        # Обучение на случайной выборке: FAISS все равно использует не больше 256 точек на кластер
+        if not index_added.is_trained:
+            index_added.train(sample_rows(features, max(64 * n_ivf, TRAIN_SAMPLE_SIZE), rng))
+
+        for _, batch in iter_batches(features, batch_size_add):
+            index_added.add(batch)
+        build_time = time.perf_counter() - start
+
+        # Эталон для замера — полный перебор по тем же векторам, что и в индексе
+        ground_truth = exact_neighbors(queries, features, SEARCH_K, batch_size_add)
+
+        if search_param == "nprobe":
+            values = [n for n in (1, 2, 4, 8, 16, 32, 64, 128) if n <= n_ivf]
+        else:
+            values = [16, 32, 64, 128, 256]
+        results = benchmark_search(index_added, search_param, values, queries, ground_truth)
+
+        print(f"Индекс {factory}: {index_added.ntotal} векторов, построен за {build_time:.1f} с")
+        print(f"  {search_param:>8} {'запросов/с':>12} {'мс/1000':>8} {'recall@8':>9}")
+        for result in results:
+            print(f"  {result[search_param]:>8} {result['qps']:>12.0f} {1e6 / result['qps']:>8.1f} {result['recall']:>9.3f}")
+
+        chosen = choose_search_param(results, search_param, target_recall, search_budget_ms)
+        faiss.ParameterSpace().set_index_parameters(index_added, f"{search_param}={chosen[search_param]}")
+        print(
+            f"Выбрано {search_param}={chosen[search_param]} (recall@8 {chosen['recall']:.3f}, {chosen['qps']:.0f} запросов/с; "
+            f"предел {MAX_SEARCH_PARAMS[search_param]}, бюджет {search_budget_ms:.0f} мс/1000 запросов)"
+        )
 
         faiss.write_index(index_added, index_filepath)
+
+        # Метаданные индекса: параметры поиска применяются при загрузке индекса для инференса
+        metadata = {
+            "index_type": index_type,
+            "factory": factory,
+            "search_params": {search_param: chosen[search_param]},
+            "recall@8": chosen["recall"],
+            "qps": chosen["qps"],
+            "search_budget_ms": search_budget_ms,
+            "benchmark": results,
+        }
+        with open(os.path.splitext(index_filepath)[0] + ".index.json", "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
         print(f"Индекс успешно сохранен - '{index_filepath}'")
 
 except Exception as error:
@@ -15,7 +15,7 @@ from tqdm import tqdm
 sys.path.append(os.getcwd())
 
 from rvc.lib.audio import load_audio
-from rvc.lib.predictors.f0 import CREPE, FCPE, RMVPE
+from rvc.lib.predictors.f0 import predictor_pool
 
 os.environ["CUDA_VISIBLE_DEVICES"] = "0"
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
@@ -48,12 +48,7 @@ class DataPreprocessor:
         # Инициализация моделей
         self.hubert_model = self._load_hubert_model()
 
-        if f0_method in ("crepe", "crepe-tiny"):
-            self.model = CREPE(device=self.device, sample_rate=self.sample_rate, hop_size=self.hop_size)
-        elif f0_method == "fcpe":
-            self.model = FCPE(device=self.device, sample_rate=self.sample_rate, hop_size=self.hop_size)
-        elif f0_method in ("rmvpe", "rmvpe+"):
-            self.model = RMVPE(device=self.device, sample_rate=self.sample_rate)
+        self.model = predictor_pool.warmup(f0_method, self.device)
         self.f0_method = f0_method
 
     def _load_hubert_model(self):
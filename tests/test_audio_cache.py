@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import pytest
+
+sf = pytest.importorskip("soundfile")
+audio = pytest.importorskip("rvc.lib.audio")
+
+
+def write_flac(path, seconds):
+    t = np.arange(int(16000 * seconds)) / 16000
+    sf.write(str(path), (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), 16000, format="FLAC")
+    return str(path)
+
+
+def cached_files(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith(".npy"))
+
+
+def test_decoded_audio_is_cached(tmp_path):
+    cache_dir = tmp_path / "cache"
+    path = write_flac(tmp_path / "a.flac", 0.5)
+    first = audio.load_audio(path, 16000, str(cache_dir))
+    assert len(cached_files(cache_dir)) == 1
+    assert np.array_equal(audio.load_audio(path, 16000, str(cache_dir)), first)
+
+
+def test_audio_cache_is_capped_by_size(tmp_path):
+    # Каждый файл ~32 КБ (0.5 с float32 при 16 кГц), лимит ~80 КБ — помещаются два
+    cache_dir = tmp_path / "cache"
+    paths = [write_flac(tmp_path / f"{name}.flac", 0.5) for name in ("old", "mid", "new")]
+    cache_max_mb = 80 / 1024
+    for age, path in enumerate(paths[:2]):
+        audio.load_audio(path, 16000, str(cache_dir), cache_max_mb)
+        cache_path = audio._cache_path(path, 16000, str(cache_dir))
+        mtime = os.path.getmtime(cache_path) - (100 - age * 10)
+        os.utime(cache_path, (mtime, mtime))
+
+    # Повторная загрузка из кэша обновляет отметку использования: "old" становится самым свежим
+    audio.load_audio(paths[0], 16000, str(cache_dir), cache_max_mb)
+    audio.load_audio(paths[2], 16000, str(cache_dir), cache_max_mb)
+
+    kept = {os.path.basename(audio._cache_path(path, 16000, str(cache_dir))) for path in (paths[0], paths[2])}
+    assert set(cached_files(cache_dir)) == kept
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+f0_module = pytest.importorskip("rvc.lib.predictors.f0")
+
+AutoTune = f0_module.AutoTune
+NOTE_NAMES = f0_module.NOTE_NAMES
+SCALES = f0_module.SCALES
+
+
+def reference_autotune(autotune, f0, strength, scale, key):
+    # Исходный покадровый цикл, ограниченный нотами выбранной гаммы.
+    # float(freq): при numpy<2 из requirements.txt расстояния считались в float64
+    notes = autotune.get_notes(scale, key).tolist()
+    autotuned_f0 = np.zeros_like(f0)
+    for i, freq in enumerate(f0):
+        freq = float(freq)
+        if freq <= 0:
+            continue
+        closest_note = min(notes, key=lambda x: abs(x - freq))
+        autotuned_f0[i] = freq + (closest_note - freq) * strength
+    return autotuned_f0
+
+
+def make_f0(autotune, seed):
+    rng = np.random.default_rng(seed)
+    notes = autotune.note_table
+    midpoints = (notes[1:] + notes[:-1]) / 2
+    f0 = np.concatenate(
+        [
+            rng.uniform(40, 1200, 4000),  # в том числе ниже G1 и выше C6
+            notes,  # точные ноты
+            midpoints,  # ровно посередине между нотами
+            np.zeros(200),  # невокализованные кадры
+        ]
+    )
+    rng.shuffle(f0)
+    return f0.astype(np.float32)
+
+
+@pytest.mark.parametrize("scale", list(SCALES))
+@pytest.mark.parametrize("key", NOTE_NAMES)
+def test_autotune_matches_reference_loop(scale, key):
+    autotune = AutoTune()
+    f0 = make_f0(autotune, seed=NOTE_NAMES.index(key))
+    for strength in (1.0, 0.5):
+        expected = reference_autotune(autotune, f0, strength, scale, key)
+        actual = autotune.autotune_f0(f0, strength, scale, key)
+        assert actual.dtype == f0.dtype
+        np.testing.assert_allclose(actual, expected, rtol=1e-6)
+
+
+def test_unvoiced_frames_stay_unvoiced():
+    autotune = AutoTune()
+    f0 = np.array([0.0, 220.0, 0.0, 233.0, 0.0], dtype=np.float32)
+    actual = autotune.autotune_f0(f0, 1.0, "major", "A")
+    assert np.all(actual[f0 == 0] == 0)
+    assert np.all(actual[f0 > 0] > 0)
+
+
+def test_notes_follow_scale_and_key():
+    autotune = AutoTune()
+    notes = autotune.get_notes("pentatonic_minor", "A")
+    # A, C, D, E, G
+    classes = {int(round(12 * np.log2(note / 440.0))) % 12 for note in notes}
+    assert classes == {0, 3, 5, 7, 10}
+    with pytest.raises(ValueError):
+        autotune.get_notes("dorian", "C")
+    with pytest.raises(ValueError):
+        autotune.get_notes("major", "H")
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+batch = pytest.importorskip("rvc.infer.batch")
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\0")
+
+
+def test_manifest_skips_duplicate_lines(tmp_path):
+    touch(tmp_path / "songs" / "a.wav")
+    manifest = tmp_path / "list.txt"
+    manifest.write_text(f"songs/a.wav\n./songs/a.wav\n{tmp_path / 'songs' / 'a.wav'}\n", encoding="utf-8")
+
+    files = batch.collect_inputs(str(manifest))
+    assert files == [(str(tmp_path / "songs" / "a.wav"), os.path.join("songs", "a.wav"))]
+
+
+def test_colliding_outputs_are_disambiguated(tmp_path):
+    # Одинаковые имена из разных папок вне манифеста и a.wav/a.mp3 в одной папке
+    for path in ("one/a.wav", "two/a.wav", "local/b.wav", "local/b.mp3"):
+        touch(tmp_path / path)
+    manifest = tmp_path / "inputs" / "list.txt"
+    manifest.parent.mkdir()
+    manifest.write_text(
+        "\n".join(str(tmp_path / path) for path in ("one/a.wav", "two/a.wav", "local/b.wav", "local/b.mp3")), encoding="utf-8"
+    )
+
+    output_dir = str(tmp_path / "out")
+    assigned = batch.assign_output_paths(batch.collect_inputs(str(manifest)), output_dir, "model", "wav")
+    outputs = [os.path.relpath(output, output_dir) for _, output in assigned]
+
+    assert outputs == ["a_(model).wav", "a_2_(model).wav", "b_(model).wav", "b_2_(model).wav"]
+    # Повторный запуск дает те же имена, поэтому возобновление пропускает готовые файлы
+    assert batch.assign_output_paths(batch.collect_inputs(str(manifest)), output_dir, "model", "wav") == assigned
+
+
+def test_folder_keeps_structure(tmp_path):
+    for path in ("x/a.wav", "y/a.wav"):
+        touch(tmp_path / "in" / path)
+    assigned = batch.assign_output_paths(batch.collect_inputs(str(tmp_path / "in")), "out", "m", "flac")
+    assert [output for _, output in assigned] == [os.path.join("out", "x", "a_(m).flac"), os.path.join("out", "y", "a_(m).flac")]
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+export = pytest.importorskip("rvc.infer.export")
+
+# Маленькая модель v2 на 40 кГц: 4 повышающих слоя дают 400 отсчетов на кадр
+CONFIG = [33, 32, 16, 16, 32, 2, 2, 3, 0.0, "1", [3], [[1, 3, 5]], [10, 10, 2, 2], 32, [20, 20, 4, 4], 4, 16, 40000]
+# Длины короче и длиннее окна относительного внимания (10) и длины трассировки (200)
+FRAMES = (8, 150, 320)
+
+
+@pytest.fixture
+def deterministic(monkeypatch):
+    # Случайная фаза синусного генератора и шум латентов заменяются нулями и при экспорте, и в eager
+    monkeypatch.setattr(torch, "rand", lambda *size, **kwargs: torch.zeros(*size, **kwargs))
+    monkeypatch.setattr(torch, "randn_like", torch.zeros_like)
+
+
+def save_model(path, use_f0):
+    torch.manual_seed(0)
+    net_g = export.Synthesizer(*CONFIG, use_f0=use_f0, text_enc_hidden_dim=768)
+    weight = {k: v for k, v in net_g.state_dict().items() if not k.startswith("enc_q")}
+    torch.save({"config": list(CONFIG), "weight": weight, "f0": int(use_f0), "version": "v2"}, path)
+
+
+def make_inputs(frames, use_f0):
+    # Входы из numpy: torch.rand подменен фикстурой deterministic
+    rng = np.random.default_rng(frames)
+    phone = torch.from_numpy(rng.random((1, frames, 768), dtype=np.float32))
+    phone_lengths = torch.tensor([frames]).long()
+    sid = torch.tensor([0]).long()
+    if not use_f0:
+        return phone, phone_lengths, sid
+    pitch = torch.from_numpy(rng.integers(1, 255, (1, frames))).long()
+    nsff0 = torch.from_numpy(rng.uniform(100, 300, (1, frames)).astype(np.float32))
+    return phone, phone_lengths, pitch, nsff0, sid
+
+
+@pytest.mark.parametrize("backend", export.EXPORT_FORMATS)
+@pytest.mark.parametrize("use_f0", [True, False])
+def test_exported_model_matches_eager(tmp_path, deterministic, backend, use_f0):
+    if backend == "onnx":
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+
+    model_path = str(tmp_path / "model.pth")
+    save_model(model_path, use_f0)
+    cpt = torch.load(model_path, map_location="cpu", weights_only=True)
+    net_g = export.build_synthesizer(cpt, model_path).float().optimize_for_inference()
+    eager = export.ExportableSynthesizer(net_g) if use_f0 else export.ExportableSynthesizerNoF0(net_g)
+
+    # Экспорт трассирует модель на 200 кадрах; граф проверяется на других длинах
+    exported = export.load_exported(model_path, backend)
+    for frames in FRAMES:
+        inputs = make_inputs(frames, use_f0)
+        with torch.no_grad():
+            expected = eager(*inputs).numpy()
+            actual = exported(*inputs).cpu().float().numpy()
+        assert actual.shape == expected.shape == (1, 1, frames * 400)
+        np.testing.assert_allclose(actual, expected, rtol=1e-3, atol=1e-4)
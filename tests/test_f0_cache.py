@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pytest
+
+f0_cache = pytest.importorskip("rvc.infer.f0_cache")
+
+
+def set_age(cache, key, seconds_ago):
+    # Явные отметки времени вместо ожидания между записями
+    mtime = os.path.getmtime(cache._path(key)) - seconds_ago
+    os.utime(cache._path(key), (mtime, mtime))
+
+
+def test_memory_only_without_cache_dir(tmp_path):
+    cache = f0_cache.F0Cache()
+    cache.put("a", np.ones(10))
+    assert np.array_equal(cache.get("a"), np.ones(10))
+    assert cache.get("b") is None
+
+
+def test_disk_cache_is_capped_by_size(tmp_path):
+    # Каждый файл ~8 КБ (1000 float64 + заголовок), лимит ~20 КБ — помещаются два
+    cache = f0_cache.F0Cache(str(tmp_path), max_entries=1, max_disk_mb=20 / 1024)
+    for age, key in enumerate(("old", "mid")):
+        cache.put(key, np.full(1000, age, dtype=np.float64))
+        set_age(cache, key, 100 - age * 10)
+
+    # Обращение с диска обновляет отметку использования: "old" становится самым свежим
+    cache.clear()
+    assert cache.get("old") is not None
+    cache.put("new", np.zeros(1000))
+
+    files = sorted(os.listdir(tmp_path))
+    assert files == ["new.npy", "old.npy"]
+    assert sum(os.path.getsize(tmp_path / name) for name in files) <= cache.max_disk_bytes
+
+
+def test_disk_entries_survive_restart(tmp_path):
+    cache = f0_cache.F0Cache(str(tmp_path))
+    key = cache.make_key(np.arange(100, dtype=np.float32), "rmvpe", 50, 1100, 160)
+    cache.put(key, np.linspace(100, 200, 10))
+
+    restarted = f0_cache.F0Cache(str(tmp_path))
+    assert np.allclose(restarted.get(key), np.linspace(100, 200, 10))
+    assert restarted.stats()["disk_hits"] == 1
@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+torch = pytest.importorskip("torch")
+f0 = pytest.importorskip("rvc.lib.predictors.f0")
+
+
+class FakePredictor:
+    def __init__(self, kind, dtype):
+        self.kind = kind
+        self.dtype = dtype
+        self.calls = 0
+
+    def get_f0(self, audio, *args, **kwargs):
+        self.calls += 1
+
+
+def test_concurrent_get_loads_once():
+    pool = f0.F0PredictorPool()
+    started = threading.Event()
+    proceed = threading.Event()
+    calls = []
+
+    def create(kind, device, dtype=torch.float32):
+        calls.append(kind)
+        started.set()
+        proceed.wait(5)
+        return FakePredictor(kind, dtype)
+
+    pool._create = create
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.get("rmvpe", "cpu"))) for _ in range(4)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    proceed.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == ["rmvpe"]
+    assert len(results) == 4
+    assert all(result is results[0] for result in results)
+    assert not pool.loading
+
+
+def test_loading_does_not_block_other_predictors():
+    pool = f0.F0PredictorPool()
+    rmvpe_started = threading.Event()
+    fcpe_loaded = threading.Event()
+    errors = []
+
+    def create(kind, device, dtype=torch.float32):
+        # Загрузка RMVPE ждет, пока другой поток получит FCPE; под общей блокировкой это была бы взаимная блокировка
+        if kind == "rmvpe":
+            rmvpe_started.set()
+            if not fcpe_loaded.wait(5):
+                errors.append("fcpe was blocked by the rmvpe load")
+        return FakePredictor(kind, dtype)
+
+    pool._create = create
+    thread = threading.Thread(target=pool.get, args=("rmvpe", "cpu"))
+    thread.start()
+    assert rmvpe_started.wait(5)
+    assert pool.get("fcpe", "cpu").kind == "fcpe"
+    fcpe_loaded.set()
+    thread.join(5)
+    assert not errors
+
+
+def test_failed_load_lets_the_next_caller_retry():
+    pool = f0.F0PredictorPool()
+
+    def failing_create(kind, device, dtype=torch.float32):
+        raise RuntimeError("load failed")
+
+    pool._create = failing_create
+    with pytest.raises(RuntimeError):
+        pool.get("rmvpe", "cpu")
+    assert not pool.loading
+
+    pool._create = lambda kind, device, dtype=torch.float32: FakePredictor(kind, dtype)
+    assert pool.get("rmvpe", "cpu").kind == "rmvpe"
+
+
+def test_warmup_uses_the_requested_dtype():
+    pool = f0.F0PredictorPool()
+    pool._create = lambda kind, device, dtype=torch.float32: FakePredictor(kind, dtype)
+
+    warmed = pool.warmup("rmvpe", "cpu", torch.float16, seconds=0.1)
+    # Прогревается тот же экземпляр, который потом получит VC.compute_f0 с config.dtype
+    assert pool.get("rmvpe", "cpu", torch.float16) is warmed
+    assert warmed.dtype == torch.float16 and warmed.calls == 1
+    assert pool.get("rmvpe", "cpu") is not warmed
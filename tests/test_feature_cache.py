@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pytest
+
+feature_cache = pytest.importorskip("rvc.infer.feature_cache")
+
+
+def set_age(cache, key, seconds_ago):
+    # Явные отметки времени вместо ожидания между записями
+    mtime = os.path.getmtime(cache._path(key)) - seconds_ago
+    os.utime(cache._path(key), (mtime, mtime))
+
+
+def test_features_round_trip_as_float16(tmp_path):
+    cache = feature_cache.FeatureCache(str(tmp_path))
+    key = cache.make_key(np.arange(100, dtype=np.float32), "abc", 12)
+    assert cache.get(key) is None
+    cache.put(key, np.linspace(0, 1, 768 * 4, dtype=np.float32).reshape(4, 768))
+
+    feats = cache.get(key)
+    assert feats.dtype == np.float16
+    assert np.allclose(feats, np.linspace(0, 1, 768 * 4).reshape(4, 768), atol=1e-3)
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_disk_cache_is_capped_by_size(tmp_path):
+    # Каждый файл ~8 КБ (4096 float16 + заголовок), лимит ~20 КБ — помещаются два
+    cache = feature_cache.FeatureCache(str(tmp_path), max_disk_mb=20 / 1024)
+    for age, key in enumerate(("old", "mid")):
+        cache.put(key, np.full((4, 1024), age))
+        set_age(cache, key, 100 - age * 10)
+
+    # Обращение обновляет отметку использования: "old" становится самым свежим
+    assert cache.get("old") is not None
+    cache.put("new", np.zeros((4, 1024)))
+
+    files = sorted(os.listdir(tmp_path))
+    assert files == ["new.npy", "old.npy"]
+    assert sum(os.path.getsize(tmp_path / name) for name in files) <= cache.max_disk_bytes
@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+index_cache = pytest.importorskip("rvc.infer.index_cache")
+
+
+def write_index(path, seed):
+    features = np.random.default_rng(seed).standard_normal((64, 8)).astype(np.float32)
+    index = faiss.IndexFlatL2(8)
+    index.add(features)
+    faiss.write_index(index, str(path))
+    return str(path), features
+
+
+def test_concurrent_get_reads_index_once(tmp_path):
+    cache = index_cache.IndexCache()
+    path, features = write_index(tmp_path / "a.index", 0)
+    read_index = cache._read_index
+    started = threading.Event()
+    proceed = threading.Event()
+    calls = []
+
+    def slow_read_index(path):
+        calls.append(path)
+        started.set()
+        proceed.wait(5)
+        return read_index(path)
+
+    cache._read_index = slow_read_index
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(path))) for _ in range(4)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    proceed.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 4
+    assert all(index is results[0][0] for index, _ in results)
+    np.testing.assert_array_equal(results[0][1], features)
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 3
+    assert not cache.loading
+
+
+def test_index_is_read_outside_the_lock(tmp_path):
+    cache = index_cache.IndexCache()
+    path_a, _ = write_index(tmp_path / "a.index", 0)
+    path_b, features_b = write_index(tmp_path / "b.index", 1)
+    read_index = cache._read_index
+    a_started = threading.Event()
+    b_loaded = threading.Event()
+
+    def read_index_waiting_for_b(path):
+        # Чтение A ждет, пока другой поток получит B; под общей блокировкой это была бы взаимная блокировка
+        if path.endswith("a.index"):
+            a_started.set()
+            assert b_loaded.wait(5)
+        return read_index(path)
+
+    def get_a():
+        try:
+            cache.get(path_a)
+        except AssertionError as error:
+            errors.append(error)
+
+    cache._read_index = read_index_waiting_for_b
+    errors = []
+    thread = threading.Thread(target=get_a)
+    thread.start()
+    assert a_started.wait(5)
+    _, big_npy = cache.get(path_b)
+    b_loaded.set()
+    thread.join(5)
+
+    assert not errors
+    np.testing.assert_array_equal(big_npy, features_b)
+    assert cache.stats()["entries"] == 2
+
+
+def test_failed_load_lets_the_next_caller_retry(tmp_path):
+    cache = index_cache.IndexCache()
+    path, features = write_index(tmp_path / "a.index", 0)
+    read_index = cache._read_index
+
+    def failing_read_index(path):
+        raise RuntimeError("read failed")
+
+    cache._read_index = failing_read_index
+    with pytest.raises(RuntimeError):
+        cache.get(path)
+    assert not cache.loading
+
+    cache._read_index = read_index
+    np.testing.assert_array_equal(cache.get(path)[1], features)
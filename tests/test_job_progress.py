@@ -0,0 +1,95 @@
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+api = pytest.importorskip("web.api")
+infer = pytest.importorskip("rvc.infer.infer")
+
+# Число сегментов у каждой модели разное, чтобы прогресс одной задачи нельзя было спутать с другой
+SEGMENTS = {"a": 20, "b": 30, "c": 10}
+
+
+class FakeVC:
+    def __init__(self, segments):
+        self.segments = segments
+
+    def pipeline(self, *args, progress_callback=None, **kwargs):
+        for done in range(1, self.segments + 1):
+            progress_callback(done, self.segments)
+            time.sleep(0.002)
+        return np.zeros(16000, dtype=np.float32)
+
+
+@pytest.fixture
+def input_path(monkeypatch, tmp_path):
+    # Заменяем только загрузку моделей, чтение/запись аудио и сам конвейер: прогресс идёт через настоящий display_progress
+    @contextmanager
+    def cached_hubert(model_path):
+        yield None
+
+    @contextmanager
+    def cached_vc(model_path):
+        yield "v2", None, 40000, FakeVC(SEGMENTS[model_path]), True
+
+    monkeypatch.setattr(infer, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(infer, "load_rvc_model", lambda rvc_model: (rvc_model, None))
+    monkeypatch.setattr(infer, "cached_hubert", cached_hubert)
+    monkeypatch.setattr(infer, "cached_vc", cached_vc)
+    monkeypatch.setattr(infer, "load_audio", lambda *args: np.zeros(16000, dtype=np.float32))
+    monkeypatch.setattr(infer, "write_audio", lambda *args: None)
+    path = tmp_path / "input.wav"
+    path.write_bytes(b"\0" * 16)
+    return str(path)
+
+
+def segment_descriptions(model):
+    total = SEGMENTS[model]
+    return [f"Преобразование аудио — сегмент {done}/{total}" for done in range(1, total + 1)]
+
+
+def test_concurrent_jobs_keep_separate_progress(monkeypatch, input_path):
+    legacy = dict(api.current_conversion_progress)
+    seen = {"a": [], "b": []}
+    update_progress = api.Job.update_progress
+
+    def recording_update(job, progress):
+        seen[job.kwargs["rvc_model"]].append(progress["description"])
+        update_progress(job, progress)
+
+    monkeypatch.setattr(api.Job, "update_progress", recording_update)
+
+    queue = api.JobQueue(max_workers=2, max_queue_size=4)
+    jobs = {model: queue.submit("voice_conversion", api.voice_conversion, rvc_model=model, input_path=input_path) for model in seen}
+    for job in jobs.values():
+        for snapshot in job.watch(heartbeat=0.1):
+            pass
+
+    for model, job in jobs.items():
+        assert job.status == "done"
+        assert job.result.endswith(f"input_({model}).wav")
+        assert job.progress["progress"] == 1.0
+        assert job.progress["description"].endswith(job.result)
+        segments = [description for description in seen[model] if "сегмент" in description]
+        assert segments == segment_descriptions(model)
+    # Задачи очереди не меняют глобальный прогресс синхронного API ни заменой, ни изменением на месте
+    assert api.current_conversion_progress == legacy
+
+
+def test_synchronous_call_updates_legacy_progress(input_path):
+    result = api.voice_conversion(rvc_model="c", input_path=input_path)
+    assert result.endswith("input_(c).wav")
+    assert api.current_conversion_progress["progress"] == 1.0
+    assert api.current_conversion_progress["description"].endswith(result)
+
+
+def test_display_progress_leaves_sys_path_alone():
+    # display_progress вызывается на каждый сегмент и не должен ничего импортировать или дописывать в sys.path
+    path = list(sys.path)
+    calls = []
+    for done in range(100):
+        infer.display_progress(done / 100, f"сегмент {done}", False, lambda percent, desc: calls.append(percent))
+    assert sys.path == path
+    assert len(calls) == 100
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+jobs = pytest.importorskip("web.jobs")
+
+
+def test_slots_are_limited_by_workers():
+    queue = jobs.JobQueue(max_workers=2)
+    queue.acquire_slot()
+    queue.acquire_slot()
+    with pytest.raises(jobs.QueueFullError):
+        queue.acquire_slot()
+    assert queue.stats()["streams"] == 2
+
+    queue.release_slot()
+    queue.acquire_slot()
+    queue.release_slot()
+    queue.release_slot()
+    assert queue.stats()["streams"] == 0
+
+
+def test_running_job_holds_a_slot():
+    queue = jobs.JobQueue(max_workers=1)
+    started = threading.Event()
+    proceed = threading.Event()
+
+    def work(progress_callback):
+        started.set()
+        assert proceed.wait(5)
+        return "done"
+
+    job = queue.submit("test", work)
+    assert started.wait(5)
+    with pytest.raises(jobs.QueueFullError):
+        queue.acquire_slot()
+
+    proceed.set()
+    for snapshot in job.watch(heartbeat=0.1):
+        pass
+    assert job.status == "done"
+    queue.acquire_slot()
+    queue.release_slot()
+
+
+def test_queued_job_waits_for_a_streaming_slot():
+    queue = jobs.JobQueue(max_workers=1)
+    queue.acquire_slot()
+    job = queue.submit("test", lambda progress_callback: "done")
+    # Пока слот занят потоковой конвертацией, задача не запускается
+    assert not job.finished
+    for snapshot in job.watch(heartbeat=0.05):
+        if snapshot is None:
+            break
+    assert job.status == "queued"
+
+    queue.release_slot()
+    for snapshot in job.watch(heartbeat=0.1):
+        pass
+    assert job.status == "done"
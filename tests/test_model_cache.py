@@ -0,0 +1,83 @@
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+model_cache = pytest.importorskip("rvc.infer.model_cache")
+
+
+def make_key(name):
+    return ("rvc", f"/models/{name}.pth", 0.0, "cpu", "torch.float32")
+
+
+def test_concurrent_acquire_loads_once():
+    cache = model_cache.ModelCache(max_memory_mb=64)
+    key = make_key("a")
+    started = threading.Event()
+    proceed = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(threading.current_thread().name)
+        started.set()
+        proceed.wait(5)
+        return np.zeros(16, dtype=np.float32)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.acquire(key, loader))) for _ in range(4)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    proceed.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 4
+    assert all(result is results[0] for result in results)
+    assert cache.entries[key].refcount == 4
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 3
+    assert not cache.loading
+
+
+def test_loader_runs_outside_the_lock():
+    cache = model_cache.ModelCache(max_memory_mb=64)
+    b_loaded = threading.Event()
+
+    def load_a():
+        # Загрузка A ждет, пока другой поток загрузит B; под общей блокировкой это была бы взаимная блокировка
+        assert b_loaded.wait(5)
+        return np.zeros(4)
+
+    def load_b():
+        value = np.ones(4)
+        b_loaded.set()
+        return value
+
+    thread = threading.Thread(target=cache.acquire, args=(make_key("a"), load_a))
+    thread.start()
+    assert cache.acquire(make_key("b"), load_b)[0] == 1
+    thread.join(5)
+    assert not thread.is_alive()
+    assert set(cache.entries) == {make_key("a"), make_key("b")}
+
+
+def test_failed_load_is_retried():
+    cache = model_cache.ModelCache(max_memory_mb=64)
+    key = make_key("a")
+
+    def failing_loader():
+        raise RuntimeError("broken checkpoint")
+
+    with pytest.raises(RuntimeError):
+        cache.acquire(key, failing_loader)
+    assert key not in cache.entries
+    assert not cache.loading
+
+    value = cache.acquire(key, lambda: np.zeros(4))
+    assert cache.entries[key].value is value
+    cache.release(key)
+    assert cache.entries[key].refcount == 0
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+RMVPE = pytest.importorskip("rvc.lib.predictors.RMVPE")
+
+THRESHOLD = 0.05
+
+
+def make_predictor():
+    # Веса модели для декодирования не нужны: достаточно таблицы центов из __init__
+    predictor = RMVPE.RMVPEF0Predictor.__new__(RMVPE.RMVPEF0Predictor)
+    predictor.cents_mapping = np.pad(20 * np.arange(RMVPE.N_CLASS) + 1997.3794084376191, (4, 4))
+    predictor.cents_mapping_torch = None
+    return predictor
+
+
+def reference_cents(cents_mapping, salience, thred):
+    # Исходная покадровая реализация (до векторизации)
+    center = np.argmax(salience, axis=1)
+    salience = np.pad(salience, ((0, 0), (4, 4)))
+    center += 4
+    todo_salience = []
+    todo_cents_mapping = []
+    starts = center - 4
+    ends = center + 5
+    for idx in range(salience.shape[0]):
+        todo_salience.append(salience[:, starts[idx] : ends[idx]][idx])
+        todo_cents_mapping.append(cents_mapping[starts[idx] : ends[idx]])
+    todo_salience = np.array(todo_salience)
+    todo_cents_mapping = np.array(todo_cents_mapping)
+    product_sum = np.sum(todo_salience * todo_cents_mapping, 1)
+    weight_sum = np.sum(todo_salience, 1)
+    devided = product_sum / weight_sum
+    maxx = np.max(salience, axis=1)
+    devided[maxx <= thred] = 0
+    return devided
+
+
+def make_salience(seed, frames=500):
+    rng = np.random.default_rng(seed)
+    salience = rng.random((frames, RMVPE.N_CLASS)).astype(np.float32) ** 4
+    # Кадры целиком ниже порога (тишина), нулевой кадр и пики у краев шкалы (окно выходит в паддинг)
+    salience[::7] *= THRESHOLD * 0.9
+    salience[3] = 0
+    salience[5, 0] = salience[6, -1] = salience[8, 1] = salience[9, -2] = 2.0
+    return salience
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_numpy_decoder_matches_reference(seed):
+    predictor = make_predictor()
+    salience = make_salience(seed)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = reference_cents(predictor.cents_mapping, salience, THRESHOLD)
+        cents = predictor.to_local_average_cents(salience, thred=THRESHOLD)
+
+    assert (cents[::7] == 0).all()
+    np.testing.assert_array_equal(cents, expected)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_torch_decoder_matches_reference(seed):
+    predictor = make_predictor()
+    salience = make_salience(seed)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = reference_cents(predictor.cents_mapping, salience, THRESHOLD)
+    cents = predictor.to_local_average_cents(torch.from_numpy(salience), thred=THRESHOLD)
+
+    assert torch.is_tensor(cents) and cents.device.type == "cpu"
+    assert (cents[::7] == 0).all()
+    # Путь torch считает в float32, эталон — в float64
+    np.testing.assert_allclose(cents.numpy(), expected, rtol=1e-5)
+
+
+def test_decode_zeroes_unvoiced_frames_on_both_paths():
+    predictor = make_predictor()
+    salience = make_salience(3)
+    f0_numpy = predictor.decode(salience, thred=THRESHOLD)
+    f0_torch = predictor.decode(torch.from_numpy(salience), thred=THRESHOLD)
+
+    assert isinstance(f0_torch, np.ndarray)
+    assert (f0_numpy[::7] == 0).all() and (f0_torch[::7] == 0).all()
+    np.testing.assert_allclose(f0_torch, f0_numpy, rtol=1e-5)
@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+RMVPE = pytest.importorskip("rvc.lib.predictors.RMVPE")
+
+
+def make_stream():
+    # Вместо сети «F0» кадра — первый мел-канал, поэтому выход потока сравним с мел-спектрограммой
+    mel_extractor = RMVPE.MelSpectrogram(RMVPE.N_MELS, 16000, 1024, 160, None, 30, 8000)
+    predictor = SimpleNamespace(
+        mel_extractor=mel_extractor,
+        device="cpu",
+        mel2hidden=lambda mel: mel.transpose(1, 2),
+        decode=lambda hidden, thred: hidden[:, 0],
+    )
+    return RMVPE.RMVPEStream(predictor, lookahead_frames=4)
+
+
+@pytest.mark.parametrize("length, block", [(700, 160), (16000, 4800), (48077, 1000)])
+def test_stream_matches_centered_stft(length, block):
+    audio = np.random.default_rng(length).standard_normal(length).astype(np.float32) * 0.1
+    stream = make_stream()
+    frames = [stream.push(audio[start : start + block]) for start in range(0, length, block)]
+    frames.append(stream.flush())
+    streamed = np.concatenate(frames)
+
+    # Офлайн-путь infer_from_audio: центрированное STFT с отражением на краях
+    with torch.no_grad():
+        expected = stream.predictor.mel_extractor(torch.from_numpy(audio).unsqueeze(0), center=True)[0, 0].numpy()
+    assert streamed.shape == expected.shape == (length // 160 + 1,)
+    np.testing.assert_allclose(streamed, expected, rtol=1e-4, atol=1e-4)
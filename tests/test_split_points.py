@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pipeline = pytest.importorskip("rvc.infer.pipeline")
+
+SAMPLE_RATE = 16000
+
+
+def make_vc():
+    config = SimpleNamespace(
+        x_pad=1,
+        x_query=6,
+        x_center=38,
+        x_max=41,
+        device="cpu",
+        dtype=None,
+        precision="fp32",
+        backend="torch",
+        batch_size=1,
+        index_cache_size=1,
+        index_mmap=False,
+        f0_cache=False,
+        feature_cache=False,
+    )
+    return pipeline.VC(40000, config)
+
+
+def reference_split_points(vc, audio_pad, audio_len):
+    # Исходный цикл из VC.pipeline
+    audio_sum = np.zeros(audio_len, dtype=audio_pad.dtype)
+    for i in range(vc.window):
+        audio_sum += audio_pad[i : i - vc.window]
+    opt_ts = []
+    for t in range(vc.t_center, audio_len, vc.t_center):
+        segment = audio_sum[t - vc.t_query : t + vc.t_query]
+        opt_ts.append(t - vc.t_query + np.where(np.abs(segment) == np.abs(segment).min())[0][0])
+    return opt_ts
+
+
+def make_audio(seconds, seed):
+    rng = np.random.default_rng(seed)
+    n = seconds * SAMPLE_RATE
+    t = np.arange(n) / SAMPLE_RATE
+    # Тон с паузами, шумовой пол и вставки почти полной тишины
+    audio = 0.3 * np.sin(2 * np.pi * 180 * t) * (np.sin(2 * np.pi * 0.3 * t) > 0.2)
+    audio += rng.standard_normal(n) * 1e-4
+    for start in rng.integers(0, n - SAMPLE_RATE, seconds // 20):
+        audio[start : start + SAMPLE_RATE // 2] = rng.standard_normal(SAMPLE_RATE // 2) * 1e-6
+    return audio.astype(np.float32)
+
+
+@pytest.mark.parametrize("seconds, seed", [(50, 0), (300, 1), (600, 2), (38 * 3 + 1, 3)])
+def test_split_points_match_reference_loop(seconds, seed):
+    vc = make_vc()
+    audio = make_audio(seconds, seed)
+    audio_pad = np.pad(audio, (vc.window // 2, vc.window // 2), mode="reflect")
+    expected = reference_split_points(vc, audio_pad, audio.shape[0])
+    actual = vc.get_split_points(audio_pad, audio.shape[0])
+
+    assert len(actual) == len(expected)
+    audio_pad64 = audio_pad.astype(np.float64)
+    for new, old in zip(actual, expected):
+        if new == old:
+            continue
+        # Расхождение допустимо только при равенстве сумм в пределах округления float32 исходного цикла
+        new_sum = abs(audio_pad64[new : new + vc.window].sum())
+        old_sum = abs(audio_pad64[old : old + vc.window].sum())
+        tolerance = np.finfo(np.float32).eps * vc.window * np.abs(audio_pad[old : old + vc.window]).max()
+        assert new_sum <= old_sum + tolerance
+
+
+def test_short_audio_has_no_split_points():
+    vc = make_vc()
+    audio = make_audio(30, 4)
+    audio_pad = np.pad(audio, (vc.window // 2, vc.window // 2), mode="reflect")
+    assert vc.get_split_points(audio_pad, audio.shape[0]) == []
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+streaming = pytest.importorskip("rvc.infer.streaming")
+
+LOOKAHEAD = 1600
+CROSSFADE = 800
+
+
+class IdentityVC:
+    """Заглушка VC: выход повторяет вход с повышением частоты в tgt_sr / 16000 раз"""
+
+    window = 160
+    sample_rate = 16000
+    device = "cpu"
+    dtype = torch.float32
+
+    def __init__(self, tgt_sr):
+        self.tgt_sr = tgt_sr
+
+    def vc(self, hubert_model, net_g, sid, audio, *args, **kwargs):
+        return np.repeat(audio, self.tgt_sr // self.sample_rate)
+
+
+@pytest.fixture(autouse=True)
+def no_highpass(monkeypatch):
+    # Без фильтра высоких частот заглушка VC становится точным тождеством, и выход можно сравнивать с входом побитно
+    monkeypatch.setattr(streaming, "bh", np.array([1.0, 0.0]))
+    monkeypatch.setattr(streaming, "ah", np.array([1.0, 0.0]))
+
+
+def make_stream(tgt_sr=16000, trim_latency=False):
+    return streaming.StreamingVC(
+        None,
+        None,
+        IdentityVC(tgt_sr),
+        "v2",
+        False,
+        block_size=3200,
+        context_size=4800,
+        crossfade_size=CROSSFADE,
+        lookahead_size=LOOKAHEAD,
+        trim_latency=trim_latency,
+    )
+
+
+def run(stream, audio, chunk_sizes=(1000, 2500, 160, 7000)):
+    # Вход подается кусками, не совпадающими с границами блоков
+    outputs = []
+    pos = 0
+    i = 0
+    while pos < audio.shape[0]:
+        size = chunk_sizes[i % len(chunk_sizes)]
+        out = stream.push(audio[pos : pos + size])
+        if out is not None:
+            outputs.append(out)
+        pos += size
+        i += 1
+    out = stream.flush()
+    if out is not None:
+        outputs.append(out)
+    return np.concatenate(outputs)
+
+
+def make_audio(length, seed=0):
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, length).astype(np.float32)
+
+
+@pytest.mark.parametrize("tgt_sr", [16000, 32000, 48000])
+def test_output_is_input_delayed_by_latency(tgt_sr):
+    stream = make_stream(tgt_sr)
+    audio = make_audio(16000 * 2 + 480)
+    out = run(stream, audio)
+
+    upp = tgt_sr // 16000
+    delay = int(stream.latency * tgt_sr)
+    assert delay == (LOOKAHEAD + CROSSFADE) * upp
+    assert out.shape[0] == audio.shape[0] * upp + delay
+    assert not out[:delay].any()
+    # Точное совпадение по всей длине: на границах блоков и в зонах кроссфейда нет разрывов
+    np.testing.assert_allclose(out[delay:], np.repeat(audio, upp), atol=1e-6)
+
+
+@pytest.mark.parametrize("tgt_sr", [16000, 48000])
+def test_trim_latency_aligns_output_with_input(tgt_sr):
+    stream = make_stream(tgt_sr, trim_latency=True)
+    audio = make_audio(16000 * 2 + 480)
+    out = run(stream, audio)
+
+    upp = tgt_sr // 16000
+    assert out.shape[0] == audio.shape[0] * upp
+    np.testing.assert_allclose(out, np.repeat(audio, upp), atol=1e-6)
+
+
+def test_short_input_is_emitted_on_flush():
+    stream = make_stream(trim_latency=True)
+    audio = make_audio(800)
+    assert stream.push(audio) is None
+    np.testing.assert_allclose(stream.flush(), audio, atol=1e-6)
+
+
+def test_reset_clears_state():
+    stream = make_stream()
+    expected = run(make_stream(), make_audio(12000, seed=1))
+
+    stream.push(make_audio(9000, seed=2))
+    stream.reset()
+    assert stream.samples_in == stream.samples_out == stream.samples_processed == 0
+    assert not stream.buffer.any() and not stream.prev_tail.any()
+    assert stream.pending.shape[0] == 0
+
+    np.testing.assert_array_equal(run(stream, make_audio(12000, seed=1)), expected)
+    # flush тоже сбрасывает состояние: тот же поток можно использовать повторно
+    np.testing.assert_array_equal(run(stream, make_audio(12000, seed=1)), expected)
+
+
+def test_sizes_must_be_multiples_of_the_frame():
+    with pytest.raises(ValueError):
+        streaming.StreamingVC(None, None, IdentityVC(16000), "v2", False, block_size=3000)
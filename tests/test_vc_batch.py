@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pipeline = pytest.importorskip("rvc.infer.pipeline")
+
+
+class FakeHubert(torch.nn.Module):
+    """Сверточный экстрактор с групповой нормализацией по времени, как в HuBERT"""
+
+    def __init__(self):
+        super().__init__()
+        self.conv = torch.nn.Conv1d(1, 16, kernel_size=400, stride=320)
+        self.norm = torch.nn.GroupNorm(16, 16)
+        self.proj = torch.nn.Linear(16, 768)
+
+    def extract_features(self, source, padding_mask=None, output_layer=None):
+        x = torch.nn.functional.gelu(self.norm(self.conv(source.unsqueeze(1))))
+        return self.proj(x.transpose(1, 2)), None
+
+
+class FakeSynthesizer(torch.nn.Module):
+    """Покадровый синтезатор без шума: каждый кадр признаков превращается в hop отсчетов"""
+
+    def infer(self, phone, phone_lengths, sid):
+        mask = torch.arange(phone.shape[1]).unsqueeze(0) < phone_lengths.unsqueeze(1)
+        frames = phone.mean(-1) * mask
+        return (frames.repeat_interleave(400, dim=1).unsqueeze(1),)
+
+
+def make_vc(batch_size):
+    config = SimpleNamespace(
+        x_pad=1,
+        x_query=6,
+        x_center=38,
+        x_max=41,
+        device="cpu",
+        dtype=torch.float32,
+        precision="fp32",
+        backend="torch",
+        batch_size=batch_size,
+        index_cache_size=1,
+        index_mmap=False,
+        f0_cache=False,
+        feature_cache=False,
+    )
+    return pipeline.VC(40000, config)
+
+
+def test_batched_segments_match_unbatched():
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    hubert = FakeHubert().eval()
+    net_g = FakeSynthesizer()
+    sid = torch.tensor([0])
+    # Сегменты разной длины, как после разрезания по тишине
+    audios = [rng.standard_normal(length).astype(np.float32) * scale for length, scale in ((48000, 0.5), (30400, 0.1), (16000, 0.9))]
+
+    vc = make_vc(batch_size=len(audios))
+    batched = vc.vc_batch(hubert, net_g, sid, audios, None, None, None, None, 0, "v2", 0.5)
+    single = [vc.vc(hubert, net_g, sid, audio, None, None, None, None, 0, "v2", 0.5) for audio in audios]
+
+    for a, b in zip(batched, single):
+        assert a.shape == b.shape
+        np.testing.assert_allclose(a, b, rtol=1e-5, atol=1e-6)
@@ -4,7 +4,7 @@ import gc
 import os
 import sys
 from contextlib import contextmanager
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
@@ -17,16 +17,30 @@ current_conversion_progress = {
     "description": "Ожидание начала конвертации",
 }
 
-from rvc.infer.infer import HUBERT_BASE_PATH, OUTPUT_DIR, RVC_MODELS_DIR, convert_audio, get_vc, load_hubert, load_rvc_model
+from rvc.infer.infer import (
+    HUBERT_BASE_PATH,
+    OUTPUT_DIR,
+    RVC_MODELS_DIR,
+    convert_audio,
+    f0_cache,
+    get_vc,
+    index_cache,
+    load_hubert,
+    load_rvc_model,
+    model_cache,
+)
 from rvc.infer.infer import rvc_edgetts_infer as _rvc_edgetts_infer
 from rvc.infer.infer import rvc_infer as _rvc_infer
+from rvc.infer.infer import rvc_infer_stream as _rvc_infer_stream
 from rvc.infer.infer import text_to_speech
+from rvc.infer.infer import unload_models as _unload_models
 from rvc.modules.model_manager import download_from_url as _download_from_url
 from rvc.modules.model_manager import upload_separate_files as _upload_separate_files
 from rvc.modules.model_manager import upload_zip_file as _upload_zip_file
 from web.gradio.components.modules import OUTPUT_FORMAT, edge_voices, get_folders
 from web.gradio.install import MODELS as HUBERT_MODELS
 from web.gradio.install import download_and_replace_model as _download_hubert_model
+from web.jobs import Job, JobQueue, QueueFullError
 
 
 @contextmanager
@@ -81,18 +95,23 @@ class MushroomRVCAPI:
         autopitch_threshold: float = 155.0,
         autotune: bool = False,
         autotune_strength: float = 1.0,
+        autotune_scale: str = "chromatic",
+        autotune_key: str = "C",
         output_format: str = "wav",
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
     ) -> str:
         try:
             # Инициализируем прогресс в начале конвертации
-            global current_conversion_progress
-            current_conversion_progress = {
-                "progress": 0.0,
-                "current_step": 0,
-                "total_steps": 10,
-                "step_name": "Инициализация",
-                "description": "Начинаем конвертацию голоса",
-            }
+            # (глобальный прогресс — только для синхронного вызова; у задач очереди прогресс свой)
+            if progress_callback is None:
+                global current_conversion_progress
+                current_conversion_progress = {
+                    "progress": 0.0,
+                    "current_step": 0,
+                    "total_steps": 10,
+                    "step_name": "Инициализация",
+                    "description": "Начинаем конвертацию голоса",
+                }
 
             # Проверка существования входного файла
             if not validate_file_exists(input_path):
@@ -141,15 +160,21 @@ class MushroomRVCAPI:
                         if not desc:
                             description = f"Преобразование аудио ({int(progress_value * 100)}%)"
 
-                    # Сохраняем прогресс в глобальную переменную для доступа из веб-интерфейса
-                    global current_conversion_progress
-                    current_conversion_progress = {
+                    # Отдельный словарь на каждый вызов: задачи очереди не должны видеть прогресс друг друга
+                    progress_state = {
                         "progress": progress_value,
                         "current_step": current_step,
                         "total_steps": self.total_steps,
                         "step_name": step_name,
                         "description": description,
                     }
+                    if progress_callback is not None:
+                        # Прогресс конкретной задачи (очередь задач веб-API)
+                        progress_callback(progress_state)
+                    else:
+                        # Синхронный вызов: глобальный прогресс для устаревшего /api/conversion-progress
+                        global current_conversion_progress
+                        current_conversion_progress = progress_state
 
             progress_tracker = ProgressTracker()
 
@@ -168,6 +193,8 @@ class MushroomRVCAPI:
                     autopitch_threshold=autopitch_threshold,
                     autotune=autotune,
                     autotune_strength=autotune_strength,
+                    autotune_scale=autotune_scale,
+                    autotune_key=autotune_key,
                     output_format=output_format,
                     progress=progress_tracker,
                 )
@@ -177,6 +204,65 @@ class MushroomRVCAPI:
         except Exception as e:
             raise Exception(f"Ошибка при преобразовании голоса: {str(e)}")
 
+    def voice_conversion_stream(
+        self,
+        rvc_model: str,
+        input_path: str,
+        f0_method: str = "rmvpe",
+        f0_min: int = 50,
+        f0_max: int = 1100,
+        rvc_pitch: int = 0,
+        protect: float = 0.5,
+        index_rate: float = 0.0,
+        volume_envelope: float = 1.0,
+        autopitch: bool = False,
+        autopitch_threshold: float = 155.0,
+        autotune: bool = False,
+        autotune_strength: float = 1.0,
+        autotune_scale: str = "chromatic",
+        autotune_key: str = "C",
+    ) -> Iterator[bytes]:
+        """
+        Потоковое преобразование голоса: возвращает итератор байтов WAV.
+        Модели загружаются до возврата, поэтому ошибки загрузки возникают сразу,
+        а не после начала ответа.
+        """
+        try:
+            if not validate_file_exists(input_path):
+                raise Exception(f"Входной файл не найден: {input_path}")
+
+            file_size = get_file_size_mb(input_path)
+            if file_size > 500:  # 500 MB лимит
+                raise Exception(f"Размер файла ({file_size:.1f} MB) превышает лимит 500 MB")
+
+            stream = _rvc_infer_stream(
+                rvc_model=rvc_model,
+                input_path=input_path,
+                f0_method=f0_method,
+                f0_min=f0_min,
+                f0_max=f0_max,
+                rvc_pitch=rvc_pitch,
+                protect=protect,
+                index_rate=index_rate,
+                volume_envelope=volume_envelope,
+                autopitch=autopitch,
+                autopitch_threshold=autopitch_threshold,
+                autotune=autotune,
+                autotune_strength=autotune_strength,
+                autotune_scale=autotune_scale,
+                autotune_key=autotune_key,
+            )
+            header = next(stream)
+        except Exception as e:
+            raise Exception(f"Ошибка при преобразовании голоса: {str(e)}")
+
+        # yield from передает закрытие (обрыв соединения) исходному генератору
+        def chunks():
+            yield header
+            yield from stream
+
+        return chunks()
+
     def text_to_speech_conversion(
         self,
         rvc_model: str,
@@ -193,21 +279,26 @@ class MushroomRVCAPI:
         autopitch_threshold: float = 155.0,
         autotune: bool = False,
         autotune_strength: float = 1.0,
+        autotune_scale: str = "chromatic",
+        autotune_key: str = "C",
         output_format: str = "wav",
         tts_rate: int = 0,
         tts_volume: int = 0,
         tts_pitch: int = 0,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
     ) -> Tuple[str, str]:
         try:
             # Инициализируем прогресс в начале TTS конвертации
-            global current_conversion_progress
-            current_conversion_progress = {
-                "progress": 0.0,
-                "current_step": 0,
-                "total_steps": 12,
-                "step_name": "Инициализация TTS",
-                "description": "Начинаем синтез и конвертацию речи",
-            }
+            # (глобальный прогресс — только для синхронного вызова; у задач очереди прогресс свой)
+            if progress_callback is None:
+                global current_conversion_progress
+                current_conversion_progress = {
+                    "progress": 0.0,
+                    "current_step": 0,
+                    "total_steps": 12,
+                    "step_name": "Инициализация TTS",
+                    "description": "Начинаем синтез и конвертацию речи",
+                }
 
             # Проверка длины текста
             if len(tts_text) > 10000:  # Лимит на длину текста
@@ -251,15 +342,21 @@ class MushroomRVCAPI:
                         if not desc:
                             description = f"Преобразование голоса ({int(progress_value * 100)}%)"
 
-                    # Сохраняем прогресс в глобальную переменную для доступа из веб-интерфейса
-                    global current_conversion_progress
-                    current_conversion_progress = {
+                    # Отдельный словарь на каждый вызов: задачи очереди не должны видеть прогресс друг друга
+                    progress_state = {
                         "progress": progress_value,
                         "current_step": current_step,
                         "total_steps": self.total_steps,
                         "step_name": step_name,
                         "description": description,
                     }
+                    if progress_callback is not None:
+                        # Прогресс конкретной задачи (очередь задач веб-API)
+                        progress_callback(progress_state)
+                    else:
+                        # Синхронный вызов: глобальный прогресс для устаревшего /api/conversion-progress
+                        global current_conversion_progress
+                        current_conversion_progress = progress_state
 
             tts_progress_tracker = TTSProgressTracker()
 
@@ -277,6 +374,8 @@ class MushroomRVCAPI:
                     autopitch_threshold=autopitch_threshold,
                     autotune=autotune,
                     autotune_strength=autotune_strength,
+                    autotune_scale=autotune_scale,
+                    autotune_key=autotune_key,
                     output_format=output_format,
                     tts_voice=tts_voice,
                     tts_text=tts_text,
@@ -468,6 +567,15 @@ class MushroomRVCAPI:
         except Exception as e:
             raise Exception(f"Ошибка при установке HuBERT модели: {str(e)}")
 
+    def get_model_cache_stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {"models": model_cache.stats(), "indexes": index_cache.stats()}
+        if f0_cache is not None:
+            stats["f0"] = f0_cache.stats()
+        return stats
+
+    def unload_models(self) -> None:
+        _unload_models()
+
     def get_available_models(self) -> List[str]:
         return get_folders()
 
@@ -509,6 +617,28 @@ def voice_conversion(*args, **kwargs):
     return api.voice_conversion(*args, **kwargs)
 
 
+def voice_conversion_stream(*args, **kwargs):
+    """
+    Потоковая конвертация занимает слот обработчика очереди задач на все время ответа.
+    Если свободных слотов нет, вызывает QueueFullError.
+    """
+    job_queue.acquire_slot()
+    try:
+        stream = api.voice_conversion_stream(*args, **kwargs)
+    except BaseException:
+        job_queue.release_slot()
+        raise
+
+    # Слот освобождается и при завершении, и при обрыве соединения (закрытии генератора)
+    def chunks():
+        try:
+            yield from stream
+        finally:
+            job_queue.release_slot()
+
+    return chunks()
+
+
 def text_to_speech_conversion(*args, **kwargs):
     return api.text_to_speech_conversion(*args, **kwargs)
 
@@ -529,6 +659,42 @@ def install_hubert_model(*args, **kwargs):
     return api.install_hubert_model(*args, **kwargs)
 
 
+def get_model_cache_stats():
+    return api.get_model_cache_stats()
+
+
+# Очередь асинхронных задач: RVC_JOB_WORKERS обработчиков, не более RVC_JOB_QUEUE_SIZE задач в ожидании
+job_queue = JobQueue(int(os.environ.get("RVC_JOB_WORKERS", 1)), int(os.environ.get("RVC_JOB_QUEUE_SIZE", 16)))
+
+JOB_FUNCTIONS = {
+    "voice_conversion": voice_conversion,
+    "tts_conversion": text_to_speech_conversion,
+}
+
+
+def submit_job(kind: str, **kwargs) -> Job:
+    """Ставит конвертацию в очередь; при заполненной очереди вызывает QueueFullError"""
+    if kind not in JOB_FUNCTIONS:
+        raise ValueError(f"Неизвестный тип задачи: {kind}")
+    return job_queue.submit(kind, JOB_FUNCTIONS[kind], **kwargs)
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    return job_queue.get(job_id)
+
+
+def cancel_job(job_id: str) -> Optional[Job]:
+    return job_queue.cancel(job_id)
+
+
+def get_job_queue_stats():
+    return job_queue.stats()
+
+
+def unload_models():
+    return api.unload_models()
+
+
 def get_available_models():
     return api.get_available_models()
 
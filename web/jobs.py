@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+JOB_STATUSES = ("queued", "running", "done", "error", "cancelled")
+
+
+class QueueFullError(Exception):
+    """Очередь задач заполнена"""
+
+
+class JobCancelled(Exception):
+    """Задача отменена пользователем"""
+
+
+class Job:
+    def __init__(self, kind: str, func: Callable, kwargs: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.func = func
+        self.kwargs = kwargs
+        self.status = "queued"
+        self.progress = {
+            "progress": 0.0,
+            "current_step": 0,
+            "total_steps": 0,
+            "step_name": "В очереди",
+            "description": "Задача ожидает свободного обработчика",
+        }
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        # Номер версии состояния растет при каждом изменении; подписчики ждут его изменения
+        self.version = 0
+        self.condition = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error", "cancelled")
+
+    def update_progress(self, progress: Dict[str, Any]) -> None:
+        """Обновляет прогресс задачи; прерывает выполнение, если задача отменена"""
+        if self.cancel_event.is_set():
+            raise JobCancelled("Задача отменена")
+        with self.condition:
+            self.progress = dict(progress)
+            self._changed()
+
+    def set_status(self, status: str, **fields) -> None:
+        with self.condition:
+            self.status = status
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self._changed()
+
+    def _changed(self) -> None:
+        self.version += 1
+        self.condition.notify_all()
+
+    def watch(self, heartbeat: float = 15.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Генератор состояний задачи: выдает снимок to_dict() при каждом изменении
+        и None, если за heartbeat секунд изменений не было. Завершается после
+        финального состояния (done, error, cancelled).
+        """
+        version = -1
+        while True:
+            with self.condition:
+                if self.version == version:
+                    self.condition.wait(heartbeat)
+                if self.version == version:
+                    snapshot = None
+                else:
+                    version = self.version
+                    snapshot = self.to_dict()
+            yield snapshot
+            if snapshot is not None and snapshot["status"] in ("done", "error", "cancelled"):
+                return
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Очередь задач конвертации с ограниченным пулом обработчиков.
+
+    Обработчики — потоки текущего процесса, поэтому все задачи используют общий кэш
+    уже загруженных моделей. Если в очереди max_queue_size задач, новая задача
+    отклоняется с QueueFullError (в HTTP API — ответ 429).
+
+    Задачи и потоковые конвертации делят max_workers слотов: одновременно выполняется
+    не более max_workers конвертаций. Потоковой конвертации слот выдается сразу или не выдается
+    вовсе (QueueFullError), ждать в очереди она не может.
+    """
+
+    def __init__(self, max_workers: int = 1, max_queue_size: int = 16, max_finished: int = 100):
+        self.max_workers = max(1, max_workers)
+        self.max_finished = max_finished
+        self.pending = queue.Queue(maxsize=max(1, max_queue_size))
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.workers: List[threading.Thread] = []
+        self.slots = threading.Semaphore(self.max_workers)
+        self.active_streams = 0
+
+    def _start_workers(self) -> None:
+        # Потоки запускаются при первой задаче, а не при импорте модуля
+        if self.workers:
+            return
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker, name=f"rvc-job-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, kind: str, func: Callable, **kwargs) -> Job:
+        """
+        Ставит задачу в очередь. func вызывается с kwargs и аргументом progress_callback,
+        который нужно вызывать с текущим прогрессом (словарь).
+        """
+        job = Job(kind, func, kwargs)
+        with self.lock:
+            self._start_workers()
+            try:
+                self.pending.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError(f"Очередь заполнена ({self.pending.maxsize} задач), повторите попытку позже")
+            self.jobs[job.id] = job
+            self._prune()
+        return job
+
+    def acquire_slot(self) -> None:
+        """
+        Занимает слот обработчика для конвертации вне очереди (потоковый ответ).
+        Если все слоты заняты, вызывает QueueFullError. Слот нужно вернуть через release_slot.
+        """
+        if not self.slots.acquire(blocking=False):
+            raise QueueFullError(f"Все обработчики заняты ({self.max_workers}), повторите попытку позже")
+        with self.lock:
+            self.active_streams += 1
+
+    def release_slot(self) -> None:
+        with self.lock:
+            self.active_streams -= 1
+        self.slots.release()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Отменяет задачу. Задача в очереди не будет запущена; выполняющаяся задача
+        прерывается при следующем обновлении прогресса.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_event.set()
+        if job.status == "queued":
+            self._finish(job, "cancelled")
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            counts = {status: 0 for status in JOB_STATUSES}
+            for job in self.jobs.values():
+                counts[job.status] += 1
+            streams = self.active_streams
+        return {"workers": self.max_workers, "queue_size": self.pending.maxsize, "jobs": counts, "streams": streams}
+
+    def _worker(self) -> None:
+        while True:
+            job = self.pending.get()
+            try:
+                if job.cancel_event.is_set():
+                    continue
+                # Слот может быть занят потоковой конвертацией — ждем его освобождения
+                with self.slots:
+                    self._run(job)
+            finally:
+                self.pending.task_done()
+
+    def _run(self, job: Job) -> None:
+        job.set_status("running", started_at=time.time())
+        try:
+            result = job.func(**job.kwargs, progress_callback=job.update_progress)
+        except Exception as e:
+            # API оборачивает исключения, поэтому отмену определяем по флагу задачи
+            if job.cancel_event.is_set():
+                self._finish(job, "cancelled")
+            else:
+                print(f"[ERROR] Задача {job.id} завершилась с ошибкой:\n{traceback.format_exc()}")
+                self._finish(job, "error", error=str(e))
+            return
+
+        self._finish(job, "done", result=result)
+
+    def _finish(self, job: Job, status: str, **fields) -> None:
+        if status == "cancelled":
+            fields["progress"] = dict(job.progress, step_name="Отменено", description="Задача отменена")
+        job.set_status(status, finished_at=time.time(), **fields)
+
+    def _prune(self) -> None:
+        # Храним ограниченное число завершенных задач (самые старые удаляются первыми)
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
@@ -292,35 +292,39 @@ class ProgressManager {
         }
     }
 
-    static startRealTimeProgress(progressId) {
+    static followJob(progressId, jobId) {
         // Инициализируем прогресс
         this.updateRealTimeProgress(progressId, {
             progress: 0.0,
             current_step: 0,
             total_steps: 8,
-            step_name: appState.currentLang === 'ru' ? 'Инициализация' : 'Initialization',
-            description: appState.currentLang === 'ru' ? 'Подготовка к конвертации' : 'Preparing for conversion'
+            step_name: appState.currentLang === 'ru' ? 'В очереди' : 'Queued',
+            description: appState.currentLang === 'ru' ? 'Задача ожидает свободного обработчика' : 'Waiting for a free worker'
         });
 
-        // Запускаем опрос прогресса каждые 200ms для более плавного обновления
-        const intervalId = setInterval(async () => {
-            try {
-                const response = await fetch('/api/conversion-progress');
-                const data = await response.json();
-                if (data.success && data.progress) {
-                    this.updateRealTimeProgress(progressId, data.progress);
-                    
-                    // Останавливаем опрос, если конвертация завершена
-                    if (data.progress.progress >= 1.0) {
-                        clearInterval(intervalId);
-                    }
+        // Сервер сам присылает события при изменении прогресса (Server-Sent Events)
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`/api/jobs/${jobId}/events`);
+            const finish = (callback, value) => {
+                source.close();
+                callback(value);
+            };
+
+            source.addEventListener('progress', (event) => {
+                const job = JSON.parse(event.data);
+                this.updateRealTimeProgress(progressId, job.progress);
+            });
+            source.addEventListener('done', (event) => finish(resolve, JSON.parse(event.data)));
+            source.addEventListener('error', (event) => {
+                // Событие error без данных — обрыв соединения (EventSource переподключится сам)
+                if (event.data) {
+                    finish(reject, new Error(JSON.parse(event.data).error));
                 }
-            } catch (error) {
-                console.error('Ошибка получения прогресса:', error);
-            }
-        }, 200); // Уменьшили интервал для более плавного обновления
-        
-        return intervalId;
+            });
+            source.addEventListener('cancelled', () => {
+                finish(reject, new Error(appState.currentLang === 'ru' ? 'Задача отменена' : 'Job cancelled'));
+            });
+        });
     }
 
     static updateRealTimeProgress(progressId, progressData) {
@@ -973,39 +977,38 @@ class EventHandlers {
 
         ProgressManager.clearFileInfo('voice-conversion-progress');
         ProgressManager.show('voice-conversion-progress');
-        const progressInterval = ProgressManager.startRealTimeProgress('voice-conversion-progress');
+        formData.set('kind', 'voice_conversion');
 
         try {
-            const response = await fetch('/api/voice-conversion', {
+            const response = await fetch('/api/jobs', {
                 method: 'POST',
                 body: formData
             });
 
             const data = await response.json();
-            clearInterval(progressInterval);
+            if (!data.success) {
+                throw new Error(data.error);
+            }
 
-            if (data.success) {
-                ProgressManager.updateRealTimeProgress('voice-conversion-progress', {
-                    progress: 1.0,
-                    current_step: 8,
-                    total_steps: 8,
-                    step_name: appState.currentLang === 'ru' ? 'Завершено' : 'Completed',
-                    description: appState.currentLang === 'ru' ? 'Конвертация завершена' : 'Conversion completed'
-                });
+            const job = await ProgressManager.followJob('voice-conversion-progress', data.job_id);
 
-                UIManager.showResult({
-                    type: 'voice-conversion',
-                    outputPath: data.output_path,
-                    downloadUrl: data.download_url
-                });
+            ProgressManager.updateRealTimeProgress('voice-conversion-progress', {
+                progress: 1.0,
+                current_step: 8,
+                total_steps: 8,
+                step_name: appState.currentLang === 'ru' ? 'Завершено' : 'Completed',
+                description: appState.currentLang === 'ru' ? 'Конвертация завершена' : 'Conversion completed'
+            });
 
-                NotificationManager.show(appState.getMessage('voiceConversionComplete'), 'success');
-                ProgressManager.hide('voice-conversion-progress', 2000);
-            } else {
-                throw new Error(data.error);
-            }
+            UIManager.showResult({
+                type: 'voice-conversion',
+                outputPath: job.result,
+                downloadUrl: job.download_url
+            });
+
+            NotificationManager.show(appState.getMessage('voiceConversionComplete'), 'success');
+            ProgressManager.hide('voice-conversion-progress', 2000);
         } catch (error) {
-            clearInterval(progressInterval);
             console.error('Ошибка преобразования:', error);
             NotificationManager.show(`${appState.getMessage('conversionError')}: ${error.message}`, 'error');
             ProgressManager.hide('voice-conversion-progress', 1000);
@@ -6,6 +6,7 @@ check_and_install_models()
 
 import argparse
 import gc
+import json
 import os
 import subprocess
 import sys
@@ -13,7 +14,7 @@ import threading
 import time
 import urllib.request
 
-from flask import Flask, jsonify, render_template, request, send_file, stream_template
+from flask import Flask, Response, jsonify, render_template, request, send_file, stream_template, stream_with_context
 from flask_cloudflared import run_with_cloudflared
 from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
@@ -22,16 +23,24 @@ from web.api import current_conversion_progress  # Глобальная пере
 from web.api import validate_file_exists  # Безопасная проверка существования файлов
 from web.api import (
     MushroomRVCAPI,
+    QueueFullError,
+    cancel_job,
     convert_audio_format,
     download_model_from_url,
     get_available_models,
     get_available_voices,
+    get_job,
+    get_job_queue_stats,
+    get_model_cache_stats,
     get_output_formats,
     install_hubert_model,
+    submit_job,
     synthesize_speech,
     text_to_speech_conversion,
+    unload_models,
     upload_model_zip,
     voice_conversion,
+    voice_conversion_stream,
 )
 
 CURRENT_LANGUAGE = "ru"
@@ -415,7 +424,10 @@ def api_remove_audio():
 
 @app.route("/api/conversion-progress")
 def get_conversion_progress():
-    """Endpoint для получения текущего прогресса конвертации"""
+    """
+    Endpoint для получения текущего прогресса конвертации.
+    Устарел: прогресс задач очереди передается через /api/jobs/<job_id>/events.
+    """
     try:
         from web.api import current_conversion_progress
 
@@ -436,52 +448,65 @@ def get_conversion_progress():
         )
 
 
+def get_input_audio_path():
+    """Возвращает (путь к входному аудио, ошибка) из формы запроса: уже загруженный файл или новый"""
+    if "audio_file_path" in request.form:
+        input_path = request.form.get("audio_file_path")
+        if not validate_file_exists(input_path):
+            return None, "Загруженный файл не найден"
+        return input_path, None
+    if "audio_file" in request.files:
+        return save_uploaded_file(request.files["audio_file"], UPLOAD_FOLDER, ALLOWED_AUDIO_EXTENSIONS)
+    return None, "Файл не найден"
+
+
+def get_voice_conversion_params(form):
+    """Параметры конвертации голоса из формы запроса"""
+    return {
+        "rvc_model": form.get("rvc_model"),
+        "f0_method": form.get("f0_method", "rmvpe+"),
+        "f0_min": int(form.get("f0_min", 50)),
+        "f0_max": int(form.get("f0_max", 1100)),
+        "rvc_pitch": int(form.get("rvc_pitch", 0)),
+        "protect": float(form.get("protect", 0.5)),
+        "index_rate": float(form.get("index_rate", 0.7)),
+        "volume_envelope": float(form.get("volume_envelope", 1.0)),
+        "autopitch": form.get("autopitch") == "true",
+        "autopitch_threshold": float(form.get("autopitch_threshold", 200.0)),
+        "autotune": form.get("autotune") == "true",
+        "autotune_strength": float(form.get("autotune_strength", 0.8)),
+        "autotune_scale": form.get("autotune_scale", "chromatic"),
+        "autotune_key": form.get("autotune_key", "C"),
+        "output_format": form.get("output_format", "wav"),
+    }
+
+
+def get_tts_conversion_params(data):
+    """Параметры синтеза и конвертации речи из JSON запроса"""
+    return {
+        "rvc_model": data.get("rvc_model"),
+        "tts_text": data.get("tts_text"),
+        "tts_voice": data.get("tts_voice"),
+        "tts_rate": int(data.get("tts_rate", 0)),
+        "tts_volume": int(data.get("tts_volume", 0)),
+        "tts_pitch": int(data.get("tts_pitch", 0)),
+        "rvc_pitch": int(data.get("rvc_pitch", 0)),
+        "protect": float(data.get("protect", 0.5)),
+        "index_rate": float(data.get("index_rate", 0.7)),
+        "volume_envelope": float(data.get("volume_envelope", 1.0)),
+        "output_format": data.get("output_format", "wav"),
+    }
+
+
 @app.route("/api/voice-conversion", methods=["POST"])
 def api_voice_conversion():
     input_path = None
     try:
-        if "audio_file_path" in request.form:
-            input_path = request.form.get("audio_file_path")
-            if not validate_file_exists(input_path):
-                return jsonify({"success": False, "error": "Загруженный файл не найден"})
-        elif "audio_file" in request.files:
-            file = request.files["audio_file"]
-            input_path, error_msg = save_uploaded_file(file, UPLOAD_FOLDER, ALLOWED_AUDIO_EXTENSIONS)
-            if error_msg:
-                return jsonify({"success": False, "error": error_msg})
-        else:
-            return jsonify({"success": False, "error": "Файл не найден"})
+        input_path, error_msg = get_input_audio_path()
+        if error_msg:
+            return jsonify({"success": False, "error": error_msg})
 
-        rvc_model = request.form.get("rvc_model")
-        f0_method = request.form.get("f0_method", "rmvpe+")
-        f0_min = int(request.form.get("f0_min", 50))
-        f0_max = int(request.form.get("f0_max", 1100))
-        rvc_pitch = int(request.form.get("rvc_pitch", 0))
-        protect = float(request.form.get("protect", 0.5))
-        index_rate = float(request.form.get("index_rate", 0.7))
-        volume_envelope = float(request.form.get("volume_envelope", 1.0))
-        autopitch = request.form.get("autopitch") == "true"
-        autopitch_threshold = float(request.form.get("autopitch_threshold", 200.0))
-        autotune = request.form.get("autotune") == "true"
-        autotune_strength = float(request.form.get("autotune_strength", 0.8))
-        output_format = request.form.get("output_format", "wav")
-
-        output_path = voice_conversion(
-            rvc_model=rvc_model,
-            input_path=input_path,
-            f0_method=f0_method,
-            f0_min=f0_min,
-            f0_max=f0_max,
-            rvc_pitch=rvc_pitch,
-            protect=protect,
-            index_rate=index_rate,
-            volume_envelope=volume_envelope,
-            autopitch=autopitch,
-            autopitch_threshold=autopitch_threshold,
-            autotune=autotune,
-            autotune_strength=autotune_strength,
-            output_format=output_format,
-        )
+        output_path = voice_conversion(input_path=input_path, **get_voice_conversion_params(request.form))
 
         # Очистка памяти после конвертации
         gc.collect()
@@ -497,36 +522,43 @@ def api_voice_conversion():
         return jsonify({"success": False, "error": "Файл слишком большой (максимум 500MB)"})
 
 
+@app.route("/api/voice-conversion/stream", methods=["POST"])
+def api_voice_conversion_stream():
+    """
+    Потоковое преобразование голоса: ответ — WAV (PCM 16 бит), который передается
+    по мере готовности сегментов, поэтому воспроизведение начинается до окончания конвертации.
+    Параметры те же, что у /api/voice-conversion (output_format игнорируется).
+    Занимает слот обработчика очереди задач; если все заняты — 429.
+    """
+    input_path = None
+    try:
+        input_path, error_msg = get_input_audio_path()
+        if error_msg:
+            return jsonify({"success": False, "error": error_msg}), 400
+
+        params = get_voice_conversion_params(request.form)
+        params.pop("output_format")
+        stream = voice_conversion_stream(input_path=input_path, **params)
+
+        return Response(
+            stream_with_context(stream),
+            mimetype="audio/wav",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    except QueueFullError as e:
+        cleanup_temp_file(input_path)
+        return jsonify({"success": False, "error": str(e)}), 429
+    except Exception as e:
+        cleanup_temp_file(input_path)
+        return jsonify({"success": False, "error": str(e)}), 400
+
+
 @app.route("/api/tts-conversion", methods=["POST"])
 def api_tts_conversion():
     try:
         data = request.get_json()
 
-        rvc_model = data.get("rvc_model")
-        tts_text = data.get("tts_text")
-        tts_voice = data.get("tts_voice")
-        tts_rate = int(data.get("tts_rate", 0))
-        tts_volume = int(data.get("tts_volume", 0))
-        tts_pitch = int(data.get("tts_pitch", 0))
-        rvc_pitch = int(data.get("rvc_pitch", 0))
-        protect = float(data.get("protect", 0.5))
-        index_rate = float(data.get("index_rate", 0.7))
-        volume_envelope = float(data.get("volume_envelope", 1.0))
-        output_format = data.get("output_format", "wav")
-
-        synth_path, converted_path = text_to_speech_conversion(
-            rvc_model=rvc_model,
-            tts_text=tts_text,
-            tts_voice=tts_voice,
-            tts_rate=tts_rate,
-            tts_volume=tts_volume,
-            tts_pitch=tts_pitch,
-            rvc_pitch=rvc_pitch,
-            protect=protect,
-            index_rate=index_rate,
-            volume_envelope=volume_envelope,
-            output_format=output_format,
-        )
+        synth_path, converted_path = text_to_speech_conversion(**get_tts_conversion_params(data))
 
         # Очистка памяти после конвертации
         gc.collect()
@@ -617,6 +649,129 @@ def api_install_hubert():
         return jsonify({"success": False, "error": str(e)})
 
 
+@app.route("/api/model-cache")
+def api_model_cache():
+    try:
+        return jsonify({"success": True, "cache": get_model_cache_stats()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+
+@app.route("/api/model-cache/unload", methods=["POST"])
+def api_unload_models():
+    try:
+        unload_models()
+        return jsonify({"success": True, "cache": get_model_cache_stats()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+
+def job_state(data):
+    """Снимок задачи (Job.to_dict) со ссылкой на результат, если он готов"""
+    if data["status"] == "done":
+        output_path = data["result"][1] if data["kind"] == "tts_conversion" else data["result"]
+        data = dict(data, download_url=f"/download/{os.path.basename(output_path)}")
+    return data
+
+
+def job_response(job):
+    """Состояние задачи в формате ответа API"""
+    return {"success": True, "job": job_state(job.to_dict())}
+
+
+@app.route("/api/jobs", methods=["POST"])
+def api_submit_job():
+    """
+    Ставит конвертацию в очередь и сразу возвращает id задачи.
+    Тип задачи передается в поле kind: voice_conversion (форма, как /api/voice-conversion)
+    или tts_conversion (JSON, как /api/tts-conversion). При заполненной очереди — 429.
+    """
+    input_path = None
+    try:
+        data = request.get_json(silent=True) or {}
+        kind = request.form.get("kind") or data.get("kind") or "voice_conversion"
+        if kind == "voice_conversion":
+            input_path, error_msg = get_input_audio_path()
+            if error_msg:
+                return jsonify({"success": False, "error": error_msg}), 400
+            job = submit_job(kind, input_path=input_path, **get_voice_conversion_params(request.form))
+        elif kind == "tts_conversion":
+            job = submit_job(kind, **get_tts_conversion_params(data))
+        else:
+            return jsonify({"success": False, "error": f"Неизвестный тип задачи: {kind}"}), 400
+
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    "job_id": job.id,
+                    "status_url": f"/api/jobs/{job.id}",
+                    "events_url": f"/api/jobs/{job.id}/events",
+                }
+            ),
+            202,
+        )
+    except QueueFullError as e:
+        cleanup_temp_file(input_path)
+        return jsonify({"success": False, "error": str(e)}), 429
+    except Exception as e:
+        cleanup_temp_file(input_path)
+        return jsonify({"success": False, "error": str(e)}), 400
+
+
+@app.route("/api/jobs")
+def api_job_queue_stats():
+    try:
+        return jsonify({"success": True, "stats": get_job_queue_stats()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+
+@app.route("/api/jobs/<job_id>")
+def api_get_job(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Задача не найдена"}), 404
+    return jsonify(job_response(job))
+
+
+@app.route("/api/jobs/<job_id>/events")
+def api_job_events(job_id):
+    """
+    Поток Server-Sent Events с прогрессом задачи.
+    Пока задача выполняется, приходят события progress; последнее событие называется
+    по итоговому статусу (done, error или cancelled), после чего поток закрывается.
+    Если состояние долго не меняется, отправляется комментарий keep-alive.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Задача не найдена"}), 404
+
+    def generate():
+        for snapshot in job.watch(heartbeat=15.0):
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+                continue
+            event = snapshot["status"] if snapshot["status"] in ("done", "error", "cancelled") else "progress"
+            yield f"event: {event}\ndata: {json.dumps(job_state(snapshot), ensure_ascii=False)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        # X-Accel-Buffering отключает буферизацию ответа в nginx
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/jobs/<job_id>", methods=["DELETE"])
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def api_cancel_job(job_id):
+    job = cancel_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Задача не найдена"}), 404
+    return jsonify(job_response(job))
+
+
 @app.route("/download/<filename>")
 def download_file(filename):
     try: